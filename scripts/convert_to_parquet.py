@@ -0,0 +1,41 @@
+# scripts/convert_to_parquet.py
+"""
+Write Parquet copies of the CSV files the agents load at startup.
+With CHATBOT_USE_PARQUET=1 set, RecommendationAgent and SymptomAgent read 'data/<name>.parquet'
+instead of the CSV whenever the Parquet copy is at least as new as the CSV (re-run after editing a CSV).
+Requires pyarrow. The generated files are git-ignored; don't commit them.
+"""
+from pathlib import Path
+
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+DATA_DIR = PROJECT_ROOT / "data"
+
+# Text-only lookup files used by the chatbot agents
+CSV_FILES = [
+    "symptom_precaution.csv",
+    "symptom_Description.csv",
+    "Symptom-severity.csv",
+]
+
+
+def convert(csv_path: Path) -> bool:
+    """Convert one CSV to a Parquet sibling (all columns kept as strings)."""
+    if not csv_path.exists():
+        print(f"⚠️ Skipping missing file: {csv_path}")
+        return False
+    try:
+        df = pd.read_csv(csv_path, dtype=str)
+        out_path = csv_path.with_suffix(".parquet")
+        df.to_parquet(out_path, engine="pyarrow", index=False)
+        print(f"✅ {csv_path.name} -> {out_path.name} ({len(df)} rows)")
+        return True
+    except Exception as e:
+        print(f"❌ Failed to convert {csv_path.name}: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    converted = sum(convert(DATA_DIR / name) for name in CSV_FILES)
+    print(f"🏁 Converted {converted}/{len(CSV_FILES)} files.")
@@ -138,7 +138,7 @@ def translate_text(text, dest_lang):
 def get_recommendation_agent():
     """Load agents that are static and don't change state."""
     try:
-        rec = RecommendationAgent()
+        rec = RecommendationAgent(use_map_cache=True)
         return rec
     except Exception as e:
         st.error(f"Failed to load RecommendationAgent: {e}")
@@ -299,7 +299,7 @@ def render_chatbot_page():
                         try:
                             st.session_state.initial_symptom_text = prompt
                             # Clear only if it's a *new* initial symptom description
-                            if st.session_state.followup_manager.user_answers or st.session_state.followup_manager.pending_questions:
+                            if st.session_state.followup_manager.user_answers or st.session_state.followup_manager.has_pending_questions():
                                 st.session_state.followup_manager.clear()
                             api_response = get_diagnosis_from_api(prompt, {})
                         except Exception as e:
@@ -12,7 +12,7 @@ class ChatbotManager:
         print("Initializing chatbot agents...")
         self.symptom_agent = SymptomAgent()
         self.diagnosis_agent = DiagnosisAgent()
-        self.recommendation_agent = RecommendationAgent()
+        self.recommendation_agent = RecommendationAgent(use_map_cache=True)
         self.followup_manager = FollowUpManager()
 
         # The knowledge base (optional)
@@ -138,12 +138,12 @@ class ChatbotManager:
     def get_session_summary(self):
         fm = self.followup_manager
         answers_dict = getattr(fm, "user_answers", {})
-        pending_list = getattr(fm, "pending_questions", [])
+        pending_count = getattr(fm, "pending_count", 0)
         boosts_dict = getattr(fm, "disease_boosts", {})
 
         summary = {
             "total_questions_asked": len(answers_dict),
-            "pending_questions": len(pending_list),
+            "pending_questions": pending_count,
             "boosted_diseases": list(boosts_dict.keys()),
         }
         print(f"[ChatbotManager.get_session_summary] {summary}")
@@ -3,15 +3,26 @@ import os
 import traceback
 import sys
 import json
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, FrozenSet, Tuple
 from pathlib import Path
-from collections import Counter
+from dataclasses import dataclass, field
+import heapq
 import re # Needed for fallback CSV processing
 
+_SYMPTOM_COL_RE = re.compile(r'^symptom_\d+$')
+_PUNCT_RE = re.compile(r'[^\w\s]')
+
 # Ensure project root is in the system path for util import
 sys.path.append(str(Path(__file__).resolve().parents[2]))
 
+# --- Optional: ONNX Runtime for faster ML inference (falls back to the joblib pipeline) ---
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
 # --- CRITICAL IMPORT: TextCleaner ---
 try:
     from src.utils.text_cleaner import TextCleaner
@@ -26,6 +37,32 @@ except ImportError as e:
     # print("   DiagnosisAgent will operate without proper text cleaning!")
 
 
+@dataclass(slots=True)
+class KBRule:
+    """Compact, attribute-access view of a KB rule used in the scoring loop."""
+    symptoms: List[str] = field(default_factory=list)
+    follow_ups: List[Dict[str, Any]] = field(default_factory=list)
+    conditions: List[Dict[str, Any]] = field(default_factory=list)
+    # Canonical (stripped, lowercase) forms computed once at load time
+    condition_names: List[str] = field(default_factory=list)
+    follow_up_phrases: List[str] = field(default_factory=list)
+    symptom_word_sets: List[FrozenSet[str]] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, rule: Dict[str, Any]) -> "KBRule":
+        conditions = rule.get("conditions", []) or []
+        follow_ups = rule.get("follow_ups", []) or []
+        symptoms = rule.get("symptoms", []) or []
+        return cls(
+            symptoms=symptoms,
+            follow_ups=follow_ups,
+            conditions=conditions,
+            condition_names=[n for n in (str(c.get("name", "")).strip().lower() for c in conditions) if n],
+            follow_up_phrases=[str(f.get("question", "")).lower() for f in follow_ups],
+            symptom_word_sets=[frozenset(s.split()) for s in symptoms],
+        )
+
+
 class DiagnosisAgent:
     """
     🚀 DiagnosisAgent v3.4 (Refactored & Corrected)
@@ -37,12 +74,14 @@ class DiagnosisAgent:
     - Removed redundant methods and old hacks.
     """
 
-    def __init__(self, model_path=None, encoder_path=None, kb_path=None, csv_fallback_path=None):
+    def __init__(self, model_path=None, encoder_path=None, kb_path=None, csv_fallback_path=None, onnx_path=None):
         base = Path(__file__).resolve().parents[2]
 
         # Default paths relative to project root
         self.model_path = model_path or str(base / "models" / "optimized_nlp_pipeline.joblib")
         self.encoder_path = encoder_path or str(base / "models" / "nlp_label_encoder.joblib")
+        # ✅ Optional ONNX export of the pipeline (see train_model.py --onnx)
+        self.onnx_path = onnx_path or str(base / "models" / "optimized_nlp_pipeline.onnx")
         self.kb_path = kb_path or str(base / "data" / "english_knowledge_base.json")
         # ✅ Use the wide CSV as fallback source
         self.csv_fallback_path = csv_fallback_path or str(base / "data" / "DiseaseAndSymptoms.csv")
@@ -50,7 +89,13 @@ class DiagnosisAgent:
         # Components
         self.pipeline: Optional[Any] = None
         self.label_encoder: Optional[Any] = None
+        # Cached pipeline internals: (transformers, final estimator), see _cache_pipeline_steps
+        self._ml_steps: Optional[Tuple[List[Any], Any]] = None
+        self._ml_classes_lc: Optional[Tuple[str, ...]] = None # Lowercase class names aligned with predict_proba columns
+        self._onnx_session: Optional[Any] = None
+        self._onnx_input_name: Optional[str] = None
         self.raw_kb_rules: List[Dict[str, Any]] = []
+        self.kb_rules: List[KBRule] = [] # Slotted copies of raw_kb_rules for rule scoring
         self.kb_lookup: Dict[str, List[Dict]] = {}
         self.fallback_data_wide: Optional[pd.DataFrame] = None # Store the wide CSV
 
@@ -71,6 +116,7 @@ class DiagnosisAgent:
         self.load_model()
         self.load_knowledge_base()
         self.load_fallback_dataset() # Loads the wide CSV
+        self._warmup_inference()
 
     # ====================================================
     # LOADERS
@@ -80,15 +126,17 @@ class DiagnosisAgent:
         """Loads the ML pipeline and label encoder."""
         try:
             # ✅ Removed the __main__.TextCleaner hack - no longer needed with corrected training
+            # ✅ mmap_mode='r': numpy arrays (tree nodes, idf weights) are paged in lazily and
+            # shared read-only between worker processes instead of copied onto each heap.
             if os.path.exists(self.model_path):
-                self.pipeline = joblib.load(self.model_path)
+                self.pipeline = joblib.load(self.model_path, mmap_mode='r')
                 print(f"✅ DiagnosisAgent: Model pipeline loaded from {self.model_path}.")
             else:
                 print(f"⚠️ Warning: Model pipeline not found at {self.model_path}. ML predictions disabled.")
                 self.pipeline = None
 
             if os.path.exists(self.encoder_path):
-                self.label_encoder = joblib.load(self.encoder_path)
+                self.label_encoder = joblib.load(self.encoder_path, mmap_mode='r')
                 print(f"✅ DiagnosisAgent: Label encoder loaded from {self.encoder_path}.")
             else:
                 print(f"⚠️ Warning: Label encoder not found at {self.encoder_path}. ML predictions disabled.")
@@ -99,6 +147,51 @@ class DiagnosisAgent:
             traceback.print_exc()
             self.pipeline, self.label_encoder = None, None
 
+        self._cache_pipeline_steps()
+        self._ml_classes_lc = (
+            tuple(str(cls).lower() for cls in self.label_encoder.classes_)
+            if self.label_encoder is not None else None
+        )
+        self._load_onnx_session()
+
+    def _load_onnx_session(self):
+        """Loads the ONNX export of the pipeline if onnxruntime is installed and the export is current."""
+        self._onnx_session, self._onnx_input_name = None, None
+        if ort is None or self.label_encoder is None or not os.path.exists(self.onnx_path):
+            return
+        # Ignore an export that is older than the joblib model (i.e. the model was retrained without --onnx)
+        if os.path.exists(self.model_path) and os.path.getmtime(self.onnx_path) < os.path.getmtime(self.model_path):
+            print(f"⚠️ Warning: ONNX model at {self.onnx_path} is older than {self.model_path}. Using joblib pipeline.")
+            return
+        try:
+            self._onnx_session = ort.InferenceSession(self.onnx_path, providers=["CPUExecutionProvider"])
+            self._onnx_input_name = self._onnx_session.get_inputs()[0].name
+            print(f"✅ DiagnosisAgent: ONNX model loaded from {self.onnx_path}.")
+        except Exception as e:
+            print(f"⚠️ Warning: Could not load ONNX model ({e}). Using joblib pipeline.")
+            self._onnx_session, self._onnx_input_name = None, None
+
+    def _cache_pipeline_steps(self):
+        """
+        Keep direct references to the pipeline's fitted steps so _ml_scores can
+        call transform/predict_proba without the Pipeline wrapper on each call.
+        The TextCleaner step is skipped: _ml_scores already receives cleaned text.
+        """
+        self._ml_steps = None
+        steps = getattr(self.pipeline, "steps", None)
+        if not steps:
+            return
+        try:
+            transformers = [est for _, est in steps[:-1]
+                            if est not in (None, "passthrough") and not isinstance(est, TextCleaner)]
+            final_estimator = steps[-1][1]
+            if not hasattr(final_estimator, "predict_proba"):
+                return
+            self._ml_steps = (transformers, final_estimator)
+        except Exception as e:
+            print(f"⚠️ Warning: Could not cache pipeline steps ({e}). Using the full pipeline.")
+            self._ml_steps = None
+
     def load_knowledge_base(self):
         """Loads and indexes the JSON knowledge base."""
         try:
@@ -115,12 +208,15 @@ class DiagnosisAgent:
                 print(f"⚠️ Warning: Knowledge base file not found at {self.kb_path}. Rule-based matching disabled.")
                 self.raw_kb_rules = []
 
+            # ✅ Slotted rule objects: attribute access in the scoring loop instead of dict lookups
+            self.kb_rules = [KBRule.from_dict(rule) for rule in self.raw_kb_rules]
+
             # Index KB by lowercase condition name for fast lookup
             self.kb_lookup = {}
             for rule in self.raw_kb_rules:
                 for cond in rule.get("conditions", []):
-                    # Name should already be lowercase from the generator script
-                    name = cond.get("name", "").strip()
+                    # Canonicalize once here so lookups never need to re-lower
+                    name = str(cond.get("name", "")).strip().lower()
                     if name:
                         self.kb_lookup.setdefault(name, []).append(rule)
 
@@ -129,6 +225,7 @@ class DiagnosisAgent:
             print(f"❌ Error loading knowledge base: {e}")
             traceback.print_exc()
             self.raw_kb_rules = []
+            self.kb_rules = []
             self.kb_lookup = {}
 
     def load_fallback_dataset(self):
@@ -143,6 +240,10 @@ class DiagnosisAgent:
                      print(f"❌ Error: Fallback CSV {self.csv_fallback_path} is missing 'disease' column after cleaning.")
                      self.fallback_data_wide = None
                 else:
+                     # ✅ Strip disease names once so scoring doesn't per row (case is kept as in the CSV)
+                     self.fallback_data_wide['disease'] = (
+                         self.fallback_data_wide['disease'].fillna('').astype(str).str.strip()
+                     )
                      print(f"✅ Fallback dataset (wide) loaded with {len(self.fallback_data_wide)} entries.")
             else:
                 print(f"⚠️ Warning: Fallback dataset not found at {self.csv_fallback_path}. CSV fallback disabled.")
@@ -152,6 +253,16 @@ class DiagnosisAgent:
             traceback.print_exc()
             self.fallback_data_wide = None
 
+    def _warmup_inference(self):
+        """
+        Runs one throwaway ML prediction so lazy first-call costs (mmap page-ins,
+        ONNX session allocation, sklearn setup) are paid at startup, not on the first user.
+        """
+        try:
+            self._ml_scores(self._clean_text("fever headache"))
+        except Exception:
+            pass # Warm-up is best effort; real errors surface on the first prediction
+
     # ====================================================
     # TEXT CLEANING (Uses TextCleaner instance)
     # ====================================================
@@ -175,43 +286,55 @@ class DiagnosisAgent:
     def _ml_scores(self, cleaned_text: str) -> Dict[str, float]:
         """Return ML-based probabilities."""
         # Check if both pipeline and encoder are loaded
-        if self.pipeline is None or self.label_encoder is None:
+        if self.label_encoder is None or (self.pipeline is None and self._onnx_session is None):
             return {}
-        if not hasattr(self.pipeline, "predict_proba"):
+        if self._onnx_session is None and not hasattr(self.pipeline, "predict_proba"):
              print("⚠️ Warning: Loaded pipeline object does not have 'predict_proba' method.")
              return {}
 
         try:
-            probs = self.pipeline.predict_proba([cleaned_text])[0]
-            # Ensure classes are strings and lowercase
-            classes = [str(cls).lower() for cls in self.label_encoder.classes_]
-            return {classes[i]: float(probs[i]) for i in range(len(classes))}
+            if self._onnx_session is not None:
+                # The ONNX graph excludes TextCleaner, so it takes the cleaned text directly
+                probs = self._onnx_session.run(
+                    ["probabilities"], {self._onnx_input_name: np.array([[cleaned_text]])}
+                )[0][0]
+            elif self._ml_steps is not None:
+                transformers, final_estimator = self._ml_steps
+                features = [cleaned_text]
+                for step in transformers:
+                    features = step.transform(features)
+                probs = final_estimator.predict_proba(features)[0]
+            else:
+                probs = self.pipeline.predict_proba([cleaned_text])[0]
+            # Classes are lowercased once in load_model; fall back if the encoder was swapped in later
+            classes = self._ml_classes_lc
+            if classes is None:
+                classes = tuple(str(cls).lower() for cls in self.label_encoder.classes_)
+            # tolist() converts the whole row to Python floats in one call
+            return dict(zip(classes, probs.tolist()))
         except Exception as e:
             print(f"❌ Error during ML prediction: {e}")
             traceback.print_exc()
             return {}
 
-    def _rule_match_scores(self, cleaned_text: str) -> Dict[str, float]:
+    def _rule_match_scores(self, cleaned_text: str, text_tokens: Optional[FrozenSet[str]] = None) -> Dict[str, float]:
         """Match user input against KB rules using improved logic."""
-        if not self.raw_kb_rules:
+        if not self.kb_rules:
              return {}
 
-        # User's input symptoms as a set of individual words
-        text_tokens = set(cleaned_text.split())
+        # User's input symptoms as a set of individual words (computed once by predict when available)
+        if text_tokens is None:
+            text_tokens = frozenset(cleaned_text.split())
         scores = {}
 
-        for rule in self.raw_kb_rules:
-            # Symptoms from the rule (already lowercased during loading)
-            rule_symptoms = rule.get("symptoms", [])
+        for rule in self.kb_rules:
+            # Word sets of each rule symptom (lowercased & split once during loading)
+            rule_symptoms = rule.symptom_word_sets
             if not rule_symptoms: continue
 
-            matched_symptom_count = 0
             # ✅ IMPROVED MATCHING: Check multi-word symptoms
-            for symptom in rule_symptoms:
-                symptom_words = set(symptom.split())
-                # Check if ALL words of the symptom are present in the user's input tokens
-                if symptom_words.issubset(text_tokens):
-                    matched_symptom_count += 1
+            # A symptom matches if ALL of its words are present in the user's input tokens
+            matched_symptom_count = sum(1 for symptom_words in rule_symptoms if symptom_words <= text_tokens)
 
             if matched_symptom_count == 0: continue # Skip if no symptoms matched
 
@@ -219,39 +342,36 @@ class DiagnosisAgent:
             ratio = matched_symptom_count / len(rule_symptoms)
 
             # Check for key follow-up phrases (simple substring match is okay here)
-            key_hits = sum(1 for f in rule.get("follow_ups", []) if f.get("question", "").lower() in cleaned_text)
+            key_hits = sum(1 for phrase in rule.follow_up_phrases if phrase in cleaned_text)
             # Find the base score for conditions in this rule
-            cond_score = max([float(c.get("score", 0.5)) for c in rule.get("conditions", [])], default=0.5)
+            cond_score = max([float(c.get("score", 0.5)) for c in rule.conditions], default=0.5)
 
             # Combine scores
             weighted_score = (cond_score * ratio) + (self.key_symptom_boost * key_hits)
 
             # If score meets threshold, add/update score for associated diseases
             if weighted_score >= self.rule_match_threshold:
-                for cond in rule.get("conditions", []):
-                    # Disease name should already be lowercase from KB generation
-                    name = cond.get("name", "").strip()
-                    if name:
-                        # Keep the highest score found for this disease from any matching rule
-                        scores[name] = max(scores.get(name, 0.0), weighted_score)
+                for name in rule.condition_names:
+                    # Keep the highest score found for this disease from any matching rule
+                    scores[name] = max(scores.get(name, 0.0), weighted_score)
         return scores
 
-    def _csv_fallback_scores(self, cleaned_text: str) -> Dict[str, float]:
+    def _csv_fallback_scores(self, cleaned_text: str, text_tokens: Optional[FrozenSet[str]] = None) -> Dict[str, float]:
         """Use simple overlap matching from the WIDE CSV."""
         if self.fallback_data_wide is None:
             return {}
 
-        user_symptoms_set = set(cleaned_text.split())
+        user_symptoms_set = text_tokens if text_tokens is not None else frozenset(cleaned_text.split())
         results = {}
 
         # Identify symptom columns in the fallback data (e.g., symptom_1, symptom_2, ...)
-        symptom_cols_fallback = [col for col in self.fallback_data_wide.columns if re.match(r'^symptom_\d+$', col)]
+        symptom_cols_fallback = [col for col in self.fallback_data_wide.columns if _SYMPTOM_COL_RE.match(col)]
         if not symptom_cols_fallback:
              print("⚠️ Warning: No 'symptom_NUMBER' columns found in fallback CSV. Fallback scoring may fail.")
              return {}
 
         for _, row in self.fallback_data_wide.iterrows():
-            disease = row.get("disease", "").strip() # Already lowercased during load
+            disease = row.get("disease", "") # Already stripped during load
             if not disease: continue
 
             # ✅ Extract and standardize symptoms from the WIDE row
@@ -284,8 +404,13 @@ class DiagnosisAgent:
     def _combine_scores(self, ml_scores, rule_scores, csv_scores, followup_boosts):
         """Merge all score sources, applying boosts."""
         merged = {}
-        # Ensure all disease names are consistently lowercase
-        all_diseases = set(ml_scores.keys()) | set(rule_scores.keys()) | set(csv_scores.keys()) | set(followup_boosts.keys())
+        # ML/rule names are lowercased at load time; boosts come from the FollowUpManager, so their keys
+        # are lowercased here (boosts whose keys differ only in case are added together)
+        boosts_lc = {}
+        for disease, boost in (followup_boosts or {}).items():
+            key = str(disease).strip().lower()
+            boosts_lc[key] = boosts_lc.get(key, 0.0) + float(boost)
+        all_diseases = set(ml_scores.keys()) | set(rule_scores.keys()) | set(csv_scores.keys()) | set(boosts_lc.keys())
 
         for disease_lc in all_diseases:
             # Get scores, defaulting to 0.0
@@ -297,8 +422,8 @@ class DiagnosisAgent:
             # Giving ML highest weight, then rules, then CSV fallback
             base_score = (0.6 * m) + (0.3 * r) + (0.1 * c)
 
-            # Apply boosts from follow-up answers (keys in followup_boosts are already lowercase)
-            boost_val = float(followup_boosts.get(disease_lc, 0.0))
+            # Apply boosts from follow-up answers
+            boost_val = boosts_lc.get(disease_lc, 0.0)
 
             # Calculate final score, capped between 0.0 and 1.0
             final_score = min(max(base_score + boost_val, 0.0), 1.0)
@@ -326,7 +451,7 @@ class DiagnosisAgent:
                 if not q_text or not q_id: continue
 
                 # Use lowercase, punctuation-free text for de-duplication check
-                q_text_key = re.sub(r'[^\w\s]', '', q_text.lower()).strip()
+                q_text_key = _PUNCT_RE.sub('', q_text.lower()).strip()
 
                 if q_text_key not in seen_questions_text:
                     seen_questions_text.add(q_text_key)
@@ -338,9 +463,8 @@ class DiagnosisAgent:
 
         # Prioritize questions: Higher severity first, then potentially by frequency if needed
         # (Frequency calculation removed for simplicity, severity is primary)
-        sorted_q = sorted(questions, key=lambda q: q["severity"], reverse=True)
-
-        return sorted_q[:self.max_questions_per_disease] # Return top N questions
+        # ✅ nlargest is O(M log N) and keeps the same stable order as sorted(...)[:N]
+        return heapq.nlargest(self.max_questions_per_disease, questions, key=lambda q: q["severity"])
 
     # ====================================================
     # MAIN PREDICTION METHOD
@@ -358,10 +482,11 @@ class DiagnosisAgent:
                  print("⚠️ Warning: Input text was empty after cleaning.")
                  return {"predictions": []}
 
-            # 2. Get scores from all sources
+            # 2. Get scores from all sources (tokenize once, shared by rule & CSV scoring)
+            text_tokens = frozenset(cleaned_text.split())
             ml = self._ml_scores(cleaned_text)
-            rules = self._rule_match_scores(cleaned_text)
-            csv = self._csv_fallback_scores(cleaned_text)
+            rules = self._rule_match_scores(cleaned_text, text_tokens)
+            csv = self._csv_fallback_scores(cleaned_text, text_tokens)
 
             # 3. Get boosts from FollowUpManager (expects lowercase keys)
             boosts = {}
@@ -372,7 +497,7 @@ class DiagnosisAgent:
             combined_scores = self._combine_scores(ml, rules, csv, boosts)
 
             # 5. Get top K predictions with score > 0
-            # Ensure keys are consistently lowercase before sorting
+            # Ensure keys are consistently lowercase before sorting (CSV fallback names keep their case)
             top_predictions_raw = sorted(
                  ((disease.lower(), score) for disease, score in combined_scores.items() if score > 0),
                  key=lambda item: item[1],
@@ -446,7 +571,7 @@ if __name__ == "__main__":
         print("Result (with FollowUpManager):")
         print(json.dumps(result_with_fm, indent=2))
         print("\nFollowUpManager state after prediction:")
-        print(f"  Pending questions: {len(fm.pending_questions)}")
+        print(f"  Pending questions: {fm.pending_count}")
         print(f"  Disease boosts: {fm.get_disease_boosts()}")
 
     except ImportError:
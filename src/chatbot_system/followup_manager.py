@@ -1,38 +1,245 @@
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Mapping, Optional, Any, Tuple, Set
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import heapq
 import json
 import os
 import glob
+import hashlib
 from datetime import datetime
 import random
+import sys
+import time
+from types import MappingProxyType
+
+import numpy as np
+
+# Optional: orjson is a much faster (Rust) JSON codec; fall back to the stdlib if missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional: xxhash for fast, process-stable question ids (blake2b from hashlib otherwise)
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Optional: msgpack for the compact binary state/KB format
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def _dumps(obj: Any) -> str:
+    """Serialize to a JSON string (non-ASCII kept as UTF-8, like ensure_ascii=False)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _loads(json_str: str) -> Any:
+    """Parse a JSON string with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(json_str)
+    return json.loads(json_str)
+
+
+# --- Canonical answer vocabularies (built once at import) ---
+_YES_ANSWERS = frozenset({"y", "yes", "true", "1", "yep", "yeah", "نعم", "ايوه", "ايوا"})
+_NO_ANSWERS = frozenset({"n", "no", "false", "0", "لا", "لأ", "لاا"})
+# ✅ FIX: Added "i don't know" and "مش عارف" to the main set
+_PARTIAL_ANSWERS = frozenset({
+    "maybe", "not sure", "sometimes", "a bit", "partially", "partial",
+    "i don't know", "لا اعرف", "مش عارف",
+    "ربما", "ممكن", "قد"
+})
+
+# Flat answer -> category dispatch table: one hashed lookup per answer.
+_ANSWER_MAP: Dict[str, str] = {
+    **{s: "yes" for s in _YES_ANSWERS},
+    **{s: "no" for s in _NO_ANSWERS},
+    **{s: "partial_yes" for s in _PARTIAL_ANSWERS},
+}
+
+
+# Auto-generated question templates, pre-split around "{symptom}" (no str.format parsing per question)
+_QUESTION_TEMPLATES: Tuple[Tuple[str, str], ...] = (
+    ("Are you experiencing ", "?"),
+    ("Do you have ", "?"),
+    ("Have you been suffering from ", " recently?"),
+    ("Do you notice any ", "?"),
+    ("Have you felt ", " in the past few days?"),
+)
+
+
+def _parse_boosts(boosts: Any) -> Tuple[Tuple[str, float], ...]:
+    """
+    Normalize raw KB boosts into (disease_lower, value) pairs, parsed once per question.
+    Unparseable values become 0.0; nameless boosts are kept (they still count toward boost_total).
+    """
+    if not boosts:
+        return ()
+    try:
+        # Fast path: well-formed KB boosts, validated with one try for the whole list
+        return tuple((_intern((b.get("name") or "").strip().lower()), float(b.get("value", 0.0))) for b in boosts)
+    except Exception:
+        pass
+
+    parsed = []
+    for b in boosts:
+        if not isinstance(b, dict):
+            continue
+        try:
+            val = float(b.get("value", 0.0))
+        except Exception:
+            val = 0.0
+        parsed.append((_intern((b.get("name") or "").strip().lower()), val))
+    return tuple(parsed)
+
+
+def _intern(value: Any) -> Any:
+    """sys.intern for strings (ids/symptoms compared very often); other values pass through."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _stable_text_id(text: str) -> str:
+    """Short hex digest of text that, unlike hash(), is the same in every process."""
+    data = text.encode("utf-8")
+    if xxhash is not None:
+        return xxhash.xxh64(data).hexdigest()
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+@dataclass(slots=True)
+class PendingQuestion:
+    """Compact record for a queued question; converted to a plain dict at the public API boundary."""
+    id: str
+    text: str = ""
+    severity: int = 0
+    boost_total: float = 0.0
+    disease: Optional[str] = None
+    seq: int = 0
+    created_at: Optional[str] = None
+    asked: bool = False
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any]) -> "PendingQuestion":
+        return cls(
+            id=item["id"],
+            text=item.get("text", ""),
+            severity=item.get("severity", 0),
+            boost_total=item.get("boost_total", 0.0),
+            disease=item.get("disease"),
+            seq=item.get("seq", 0),
+            created_at=item.get("created_at"),
+            asked=item.get("asked", False),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
 
 class FollowUpManager:
     """
     FollowUpManager (complete, robust version)
 
     Responsibilities:
-    - Manage pending follow-up questions (with disease context)
+    - Manage pending follow-up questions (with disease context) in a binary heap
     - Track user answers & timestamps
     - Compute and return disease-level boosts
     - Provide disease-scoped question retrieval and global prioritization
     - Import/export state (safe JSON), load follow-ups from KB files
     """
 
+    # Parsed KB files shared by all instances: path -> (mtime_ns, size, kb dict).
+    # Treated as read-only; an edited file (new mtime/size) is re-parsed.
+    _kb_cache: Dict[str, Tuple[int, int, Dict[str, Any]]] = {}
+
     def __init__(self, negative_boost_multiplier: float = -0.25):
-        self.pending_questions: List[Dict[str, Any]] = []
-        self.user_answers: Dict[str, Dict[str, Any]] = {}
-        self.question_meta: Dict[str, Dict[str, Any]] = {}
+        # Priority queue: heap of (-severity, -boost_total, seq, qid) keys + live items by id.
+        # Entries whose item was popped elsewhere stay in the heap as tombstones until they surface.
+        self._pending_heap: List[Tuple[int, float, int, str]] = []
+        self._pending_items: Dict[str, PendingQuestion] = {}
+        # Per-disease heaps over the same keys, for disease-scoped pops (same lazy tombstones)
+        self._disease_heaps: Dict[str, List[Tuple[int, float, int, str]]] = defaultdict(list)
+        # Answers, question metadata and boosts are private; the public names are read-only views
+        # so every write goes through a method that also sets _dirty
+        self._user_answers: Dict[str, Dict[str, Any]] = {}
+        self._question_meta: Dict[str, Dict[str, Any]] = {}
         self.asked_question_ids = set()
-        self.disease_boosts: Dict[str, float] = {}
-        self._questions_by_disease: Dict[str, List[str]] = defaultdict(list)
+        self._disease_boosts: Dict[str, float] = {}
+        self._questions_by_disease: Dict[str, Set[str]] = defaultdict(set)
+        # Pre-parsed boosts per question id (derived from question_meta, never exported)
+        self._question_boosts: Dict[str, Tuple[Tuple[str, float], ...]] = {}
+        # Reverse index for scoring: disease -> [(qid, abs boost toward that disease)] + running totals
+        self._disease_to_boost_entries: Dict[str, List[Tuple[str, float]]] = defaultdict(list)
+        self._disease_total_possible: Dict[str, float] = defaultdict(float)
+        # Memoized follow-up scores, valid until the answers (or the scoring index) change;
+        # keyed on the multiplier too, since callers may reassign negative_boost_multiplier directly
+        self._answers_version = 0
+        self._score_cache: Dict[Tuple[str, int, bool, float], float] = {}
+        # (epoch second, ISO string to the second): answers within the same second reuse the formatted prefix
+        self._ts_cache: Tuple[int, str] = (-1, "")
+        # Last export_state()/to_json() results, reused until a mutator sets _dirty
+        self._dirty = True
+        self._cached_export: Optional[Dict[str, Any]] = None
+        self._cached_json: Optional[str] = None
         self._seq_counter = 0
         self.negative_boost_multiplier = float(negative_boost_multiplier)
 
+    @property
+    def user_answers(self) -> Mapping[str, Dict[str, Any]]:
+        """Read-only view of question_id -> {answer, timestamp} (use record_answer to change it)."""
+        return MappingProxyType(self._user_answers)
+
+    @property
+    def question_meta(self) -> Mapping[str, Dict[str, Any]]:
+        """Read-only view of question_id -> metadata (use add_questions to change it)."""
+        return MappingProxyType(self._question_meta)
+
+    @property
+    def disease_boosts(self) -> Mapping[str, float]:
+        """Read-only view of disease_name_lower -> accumulated boost (updated by record_answer)."""
+        return MappingProxyType(self._disease_boosts)
+
     # ---------------- adding / queue management ----------------
+    @property
+    def pending_questions(self) -> List[Dict[str, Any]]:
+        """Pending question items in priority order (a fresh list; the heap is the source of truth)."""
+        return [self._pending_items[key[3]].to_dict() for key in sorted(self._pending_heap) if self._is_live(key)]
+
+    @staticmethod
+    def _priority_key(item: PendingQuestion) -> Tuple[int, float, int, str]:
+        """Heap key: severity desc, boost_total desc, older seq first."""
+        return (-item.severity, -item.boost_total, item.seq, item.id)
+
+    def _is_live(self, key: Tuple[int, float, int, str]) -> bool:
+        """True if a heap entry still refers to a pending item (not a tombstone)."""
+        item = self._pending_items.get(key[3])
+        return item is not None and item.seq == key[2]
+
+    def _push_pending(self, item: PendingQuestion):
+        self._pending_items[item.id] = item
+        key = self._priority_key(item)
+        heapq.heappush(self._pending_heap, key)
+        if item.disease:
+            heapq.heappush(self._disease_heaps[item.disease], key)
+
+    def _drop_tombstones(self):
+        """Pop dead entries off the top of the heap so [0] is always a live item."""
+        heap = self._pending_heap
+        while heap and not self._is_live(heap[0]):
+            heapq.heappop(heap)
+
     def add_questions(self, questions: List[Dict[str, Any]], reorder: bool = True, disease_scope: Optional[str] = None) -> int:
         """
         Add multiple questions to the queue (avoiding duplicates).
         Supports optional disease_scope parameter for backward compatibility.
+        The queue is a heap, so it is always ordered; 'reorder' is kept for compatibility.
         Returns number of questions actually added.
         """
         added = 0
@@ -40,11 +247,12 @@ class FollowUpManager:
             return 0
 
         scope_key = disease_scope.strip().lower() if isinstance(disease_scope, str) and disease_scope.strip() else None
+        batch_ts = datetime.utcnow().isoformat()  # one default created_at for the whole batch
 
         for q in questions:
             if not isinstance(q, dict):
                 continue
-            qid = q.get("id") or q.get("qid") or None
+            qid = _intern(q.get("id") or q.get("qid") or None)
             if not qid:
                 continue
             if qid in self.asked_question_ids:
@@ -57,17 +265,13 @@ class FollowUpManager:
                 severity = 0
 
             disease = scope_key or (q.get("disease") or q.get("disease_name") or "")
-            disease_key = disease.strip().lower() if disease else None
+            disease_key = _intern(disease.strip().lower()) if disease else None
 
             boosts = q.get("boosts", []) or []
-            boost_total = 0.0
-            for b in boosts:
-                try:
-                    boost_total += abs(float(b.get("value", 0.0)))
-                except Exception:
-                    pass
+            boosts_norm = _parse_boosts(boosts)
+            boost_total = sum(abs(val) for _, val in boosts_norm)
 
-            created_at = q.get("created_at") or datetime.utcnow().isoformat()
+            created_at = q.get("created_at") or batch_ts
 
             meta = {
                 "text": text,
@@ -78,71 +282,82 @@ class FollowUpManager:
                 "created_at": created_at
             }
 
-            self.question_meta[qid] = meta
-
-            item = {
-                "id": qid,
-                "text": text,
-                "severity": severity,
-                "boost_total": boost_total,
-                "disease": disease_key,
-                "seq": self._seq_counter,
-                "created_at": created_at,
-                "asked": False
-            }
+            self._question_meta[qid] = meta
+            self._question_boosts[qid] = boosts_norm
+
+            item = PendingQuestion(
+                id=qid,
+                text=text,
+                severity=severity,
+                boost_total=boost_total,
+                disease=disease_key,
+                seq=self._seq_counter,
+                created_at=created_at,
+            )
             self._seq_counter += 1
 
-            self.pending_questions.append(item)
+            self._push_pending(item)
             self.asked_question_ids.add(qid)
             if disease_key:
-                self._questions_by_disease[disease_key].append(qid)
+                self._questions_by_disease[disease_key].add(qid)
+                self._index_boosts(qid, disease_key, boosts_norm)
 
             added += 1
 
-        if reorder and added > 0:
-            self._reorder_queue()
-
+        if added:
+            self._invalidate_scores()
+            self._dirty = True
         return added
 
     def _reorder_queue(self):
         """
-        Reorder pending_questions by (severity desc, boost_total desc, older seq first).
+        Rebuild the heap from live items only (drops tombstones).
+        Priority: (severity desc, boost_total desc, older seq first).
         """
-        if not self.pending_questions:
-            return
-        items = list(self.pending_questions)
-        items.sort(key=lambda x: (x.get("severity", 0), x.get("boost_total", 0.0), -x.get("seq", 0)), reverse=True)
-        self.pending_questions = items
+        self._pending_heap = [self._priority_key(item) for item in self._pending_items.values()]
+        heapq.heapify(self._pending_heap)
+        self._disease_heaps = defaultdict(list)
+        for key in self._pending_heap:
+            disease = self._pending_items[key[3]].disease
+            if disease:
+                self._disease_heaps[disease].append(key)
+        for heap in self._disease_heaps.values():
+            heapq.heapify(heap)
 
     # ---------------- peek/pop next question ----------------
     def peek_next_question(self) -> Optional[Dict[str, Any]]:
         """Return the highest-priority question object without removing it. None if empty."""
-        if not self.pending_questions:
+        self._drop_tombstones()
+        if not self._pending_heap:
             return None
-        self._reorder_queue()
 
-        item = dict(self.pending_questions[0])
-        if item and "question" not in item and "text" in item:
-            item["question"] = item["text"]
+        item = self._pending_items[self._pending_heap[0][3]].to_dict()
+        item["question"] = item["text"]
         return item
 
     def get_next_question(self) -> Optional[Dict[str, Any]]:
         """
         Pop and return the next global pending question (dict with id,text,...).
         """
-        if not self.pending_questions:
+        self._drop_tombstones()
+        if not self._pending_heap:
             return None
-        self._reorder_queue()
-        item = self.pending_questions.pop(0)
-        item["asked"] = True
+        key = heapq.heappop(self._pending_heap)
+        item = self._pending_items.pop(key[3])
+        item.asked = True
+        self._dirty = True
 
-        if item and "question" not in item and "text" in item:
-            item["question"] = item["text"]
-
-        return item
+        result = item.to_dict()
+        result["question"] = result["text"]
+        return result
 
     def has_pending_questions(self) -> bool:
-        return len(self.pending_questions) > 0
+        return len(self._pending_items) > 0
+
+    @property
+    def pending_count(self) -> int:
+        """Number of pending questions in O(1) (no sorting, unlike pending_questions)."""
+        return len(self._pending_items)
 
     # ---------------- disease-scoped helpers ----------------
     def has_followup_questions(self, disease_name: str) -> bool:
@@ -150,8 +365,8 @@ class FollowUpManager:
         if not disease_name:
             return False
         key = disease_name.strip().lower()
-        pending_ids = {q["id"] for q in self.pending_questions}
-        return any(qid in pending_ids for qid in self._questions_by_disease.get(key, []))
+        # _pending_items keys are the set of pending ids: one C-level disjointness check
+        return not self._pending_items.keys().isdisjoint(self._questions_by_disease.get(key, ()))
 
     def get_next_question_for_disease(self, disease_name: str) -> Optional[Dict[str, Any]]:
         """
@@ -160,21 +375,26 @@ class FollowUpManager:
         if not disease_name:
             return None
         key = disease_name.strip().lower()
-        if not self.pending_questions:
+        if not self._pending_items:
             return None
 
-        items = list(self.pending_questions)
-        for idx, q in enumerate(items):
-            if q.get("disease") == key and not q.get("asked"):
-                item = items.pop(idx)
-                self.pending_questions = items
-                item["asked"] = True
+        # Highest-priority live entry for this disease; its global heap entry becomes a tombstone
+        heap = self._disease_heaps.get(key)
+        while heap and (not self._is_live(heap[0]) or self._pending_items[heap[0][3]].asked):
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        best = heapq.heappop(heap)
 
-                if item and "question" not in item and "text" in item:
-                    item["question"] = item["text"]
+        item = self._pending_items.pop(best[3])
+        item.asked = True
+        self._dirty = True
+        if len(self._pending_heap) > 2 * len(self._pending_items) + 32:
+            self._reorder_queue() # Mostly tombstones: compact both heaps in one pass
 
-                return item
-        return None
+        result = item.to_dict()
+        result["question"] = result["text"]
+        return result
 
     def get_next_question_for_active_disease(self, active_disease: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
@@ -195,28 +415,9 @@ class FollowUpManager:
         """Normalize various user responses into canonical categories."""
         if answer is None:
             return ""
-        s = str(answer).strip().lower()
-
-        # --- YES ---
-        if s in ("y", "yes", "true", "1", "yep", "yeah", "نعم", "ايوه", "ايوا"):
-            return "yes"
-
-        # --- NO ---
-        if s in ("n", "no", "false", "0", "لا", "لأ", "لاا"):
-            return "no"
-
-        # --- PARTIAL / UNKNOWN ---
-        # ✅ FIX: Added "i don't know" and "مش عارف" to the main set
-        if s in (
-            "maybe", "not sure", "sometimes", "a bit", "partially", "partial",
-            "i don't know", "لا اعرف", "مش عارف",
-            "ربما", "ممكن", "قد"
-        ):
-            return "partial_yes"
-
         # ✅ FIX: Removed dangerous 'any(tok in s)' heuristics (like 'no' in 'know').
         # Any other unknown text is safer as "partial_yes" than a wrong "no".
-        return "partial_yes"
+        return _ANSWER_MAP.get(str(answer).strip().lower(), "partial_yes")
     # ✅ =================== END OF FIX ===================
 
     def record_answer(self, question_id: str, answer: Any, timestamp: Optional[str] = None):
@@ -226,11 +427,13 @@ class FollowUpManager:
         if not question_id:
             return
         norm = self._normalize_answer(answer)
-        ts = timestamp or datetime.utcnow().isoformat()
+        ts = timestamp or self._utc_now_iso()
 
-        self.user_answers[question_id] = {"answer": norm, "timestamp": ts}
+        self._user_answers[question_id] = {"answer": norm, "timestamp": ts}
+        self._invalidate_scores()
+        self._dirty = True
 
-        meta = self.question_meta.get(question_id)
+        meta = self._question_meta.get(question_id)
         if not meta:
             return
 
@@ -244,15 +447,40 @@ class FollowUpManager:
             # Default for safety (e.g., if _normalize_answer returned "")
             multiplier = 0.5
 
-        for b in meta.get("boosts", []):
-            dname = (b.get("name") or "").strip().lower()
+        for dname, val in self._boosts_for(question_id, meta):
             if not dname:
                 continue
-            try:
-                val = float(b.get("value", 0.0)) * multiplier
-            except Exception:
-                val = 0.0
-            self.disease_boosts[dname] = self.disease_boosts.get(dname, 0.0) + val
+            self._disease_boosts[dname] = self._disease_boosts.get(dname, 0.0) + val * multiplier
+
+    def _utc_now_iso(self) -> str:
+        """
+        Current UTC time as an ISO string with microseconds (same text as datetime.utcnow().isoformat()).
+        Only the date/time-to-the-second prefix is cached; it is re-formatted when the second changes.
+        """
+        sec, usec = divmod(time.time_ns() // 1000, 1_000_000)
+        if sec != self._ts_cache[0]:
+            self._ts_cache = (sec, datetime.utcfromtimestamp(sec).isoformat())
+        return f"{self._ts_cache[1]}.{usec:06d}" if usec else self._ts_cache[1]
+
+    def _invalidate_scores(self):
+        """Bump the answers version and drop memoized follow-up scores."""
+        self._answers_version += 1
+        self._score_cache.clear()
+
+    def _index_boosts(self, qid: str, disease_key: str, boosts_norm: Tuple[Tuple[str, float], ...]):
+        """Register a question's boosts toward its own disease in the scoring index."""
+        for dname, val in boosts_norm:
+            if dname != disease_key:
+                continue
+            self._disease_to_boost_entries[disease_key].append((qid, abs(val)))
+            self._disease_total_possible[disease_key] += abs(val)
+
+    def _boosts_for(self, question_id: str, meta: Dict[str, Any]) -> Tuple[Tuple[str, float], ...]:
+        """Pre-parsed boosts for a question; parses (and caches) meta set outside add_questions."""
+        boosts_norm = self._question_boosts.get(question_id)
+        if boosts_norm is None:
+            boosts_norm = self._question_boosts[question_id] = _parse_boosts(meta.get("boosts"))
+        return boosts_norm
 
     def record_answer_by_question_id(self, question_id: str, answer: Any, timestamp: Optional[str] = None):
         """Alias for clarity/backwards compatibility."""
@@ -260,14 +488,14 @@ class FollowUpManager:
 
     def get_all_answers(self) -> Dict[str, Any]:
         """Return mapping question_id -> {answer, timestamp}."""
-        return dict(self.user_answers)
+        return dict(self._user_answers)
 
     def get_all_answers_simple(self) -> Dict[str, str]:
         """
         Return mapping question_id -> simple answer string.
         """
         simple = {}
-        for qid, data in self.user_answers.items():
+        for qid, data in self._user_answers.items():
             if isinstance(data, dict):
                 simple[qid] = data.get("answer", "")
             else:
@@ -276,7 +504,7 @@ class FollowUpManager:
 
     def get_disease_boosts(self) -> Dict[str, float]:
         """Return mapping disease_name_lower -> accumulated boost value from answers."""
-        return dict(self.disease_boosts)
+        return dict(self._disease_boosts)
 
     def get_followup_score(self, disease_name: str, include_unasked: bool = False) -> float:
         """
@@ -285,55 +513,66 @@ class FollowUpManager:
         if not disease_name:
             return 0.0
         key = disease_name.strip().lower()
+        cache_key = (key, self._answers_version, include_unasked, self.negative_boost_multiplier)
+        cached = self._score_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-        total_possible = 0.0
+        no_multiplier = self.negative_boost_multiplier if self.negative_boost_multiplier < 0 else 0.0
+        total_possible = self._disease_total_possible.get(key, 0.0) if include_unasked else 0.0
         obtained = 0.0
 
-        if include_unasked:
-            qids = list(self._questions_by_disease.get(key, []))
-        else:
-            qids = [qid for qid in self.user_answers.keys() if qid in self._questions_by_disease.get(key, [])]
-
-        for qid in qids:
-            meta = self.question_meta.get(qid)
-            if not meta:
+        for qid, boost_val in self._disease_to_boost_entries.get(key, ()):
+            answer_record = self._user_answers.get(qid)
+            if answer_record is None:
                 continue
-            boosts = meta.get("boosts", [])
-            answer_record = self.user_answers.get(qid)
-            answer = answer_record.get("answer") if isinstance(answer_record, dict) else None
-            for b in boosts:
-                if (b.get("name") or "").strip().lower() != key:
-                    continue
-                try:
-                    boost_val = abs(float(b.get("value", 0.0)))
-                except Exception:
-                    boost_val = 0.0
+            if not include_unasked:
                 total_possible += boost_val
-                if answer == "yes":
-                    obtained += boost_val
-                elif answer == "partial_yes":
-                    obtained += boost_val * 0.5
-                elif answer == "no":
-                    obtained += boost_val * (self.negative_boost_multiplier if self.negative_boost_multiplier < 0 else 0.0)
+            answer = answer_record.get("answer") if isinstance(answer_record, dict) else None
+            if answer == "yes":
+                obtained += boost_val
+            elif answer == "partial_yes":
+                obtained += boost_val * 0.5
+            elif answer == "no":
+                obtained += boost_val * no_multiplier
 
         if total_possible <= 0:
-            return 0.0
-        score = obtained / total_possible
-        return float(max(0.0, min(1.0, score)))
+            score = 0.0
+        else:
+            score = float(max(0.0, min(1.0, obtained / total_possible)))
+        self._score_cache[cache_key] = score
+        return score
 
     # ---------------- persistence / import-export ----------------
+    def _export_is_fresh(self) -> bool:
+        """True if the cached export still matches the state (nothing mutated since it was built)."""
+        return (not self._dirty and self._cached_export is not None
+                and self._cached_export["negative_boost_multiplier"] == self.negative_boost_multiplier)
+
     def export_state(self) -> Dict[str, Any]:
-        """Export internal state as JSON-serializable dict (safe)."""
-        return {
+        """
+        Export internal state as JSON-serializable dict (safe).
+        Returns a copy of the cached export, so callers may modify it freely.
+        """
+        return {k: (v.copy() if isinstance(v, (dict, list)) else v) for k, v in self._export_snapshot().items()}
+
+    def _export_snapshot(self) -> Dict[str, Any]:
+        """The cached export dict itself (rebuilt after a mutation); internal read-only use only."""
+        if self._export_is_fresh():
+            return self._cached_export
+        self._cached_export = {
             "pending_questions": list(self.pending_questions),
-            "user_answers": dict(self.user_answers),
-            "question_meta": dict(self.question_meta),
+            "user_answers": dict(self._user_answers),
+            "question_meta": dict(self._question_meta),
             "asked_question_ids": list(self.asked_question_ids),
-            "disease_boosts": dict(self.disease_boosts),
+            "disease_boosts": dict(self._disease_boosts),
             "_questions_by_disease": {k: list(v) for k, v in self._questions_by_disease.items()},
             "_seq_counter": self._seq_counter,
             "negative_boost_multiplier": self.negative_boost_multiplier
         }
+        self._cached_json = None
+        self._dirty = False
+        return self._cached_export
 
     def import_state(self, state: Dict[str, Any]):
         """
@@ -345,14 +584,12 @@ class FollowUpManager:
             self.clear()
 
             pq = state.get("pending_questions", []) or []
-            safe_pq = []
             for itm in pq:
                 if not isinstance(itm, dict):
                     continue
                 if "id" not in itm:
                     continue
-                safe_pq.append(itm)
-            self.pending_questions = safe_pq
+                self._pending_items[itm["id"]] = PendingQuestion.from_dict(itm)
 
             ua = state.get("user_answers", {}) or {}
             safe_ua = {}
@@ -362,11 +599,12 @@ class FollowUpManager:
                         safe_ua[qid] = {"answer": str(val.get("answer")), "timestamp": val.get("timestamp")}
                     else:
                         safe_ua[qid] = {"answer": str(val), "timestamp": None}
-            self.user_answers = safe_ua
+            self._user_answers = safe_ua
 
             qm = state.get("question_meta", {}) or {}
             if isinstance(qm, dict):
-                self.question_meta = {k: v for k, v in qm.items() if isinstance(v, dict)}
+                self._question_meta = {k: v for k, v in qm.items() if isinstance(v, dict)}
+                self._question_boosts = {k: _parse_boosts(v.get("boosts")) for k, v in self._question_meta.items()}
 
             asked = state.get("asked_question_ids", []) or []
             if isinstance(asked, (list, set)):
@@ -380,11 +618,16 @@ class FollowUpManager:
                         safe_db[k] = float(v)
                     except Exception:
                         safe_db[k] = 0.0
-            self.disease_boosts = safe_db
+            self._disease_boosts = safe_db
 
             qby = state.get("_questions_by_disease", {}) or {}
             if isinstance(qby, dict):
-                self._questions_by_disease = defaultdict(list, {k: list(v) for k, v in qby.items()})
+                self._questions_by_disease = defaultdict(set, {k: set(v) for k, v in qby.items()})
+                for dkey, qids in self._questions_by_disease.items():
+                    for qid in qids:
+                        meta = self._question_meta.get(qid)
+                        if meta:
+                            self._index_boosts(qid, dkey, self._boosts_for(qid, meta))
 
             seq = state.get("_seq_counter")
             if isinstance(seq, int):
@@ -398,6 +641,7 @@ class FollowUpManager:
                     pass
 
             self._reorder_queue()
+            self._dirty = True
 
         except Exception:
             self.clear()
@@ -405,9 +649,11 @@ class FollowUpManager:
     def to_json(self) -> str:
         """Return JSON string of exported state (safe)."""
         try:
-            return json.dumps(self.export_state(), ensure_ascii=False)
+            if self._cached_json is None or not self._export_is_fresh():
+                self._cached_json = _dumps(self._export_snapshot())
+            return self._cached_json
         except Exception:
-            return json.dumps({
+            return _dumps({
                 "pending_questions": [],
                 "user_answers": {},
                 "question_meta": {},
@@ -416,14 +662,14 @@ class FollowUpManager:
                 "_questions_by_disease": {},
                 "_seq_counter": getattr(self, "_seq_counter", 0),
                 "negative_boost_multiplier": getattr(self, "negative_boost_multiplier", -0.25)
-            }, ensure_ascii=False)
+            })
 
     def from_json(self, json_str: Optional[str]):
         """Import state from JSON string safely."""
         if not json_str:
             return
         try:
-            obj = json.loads(json_str)
+            obj = _loads(json_str)
             self.import_state(obj)
         except Exception:
             try:
@@ -431,6 +677,70 @@ class FollowUpManager:
             except Exception:
                 pass
 
+    def dump_state(self, fp):
+        """
+        Stream the exported state as JSON into a text file object.
+        Writes one element at a time instead of building export_state() copies and one big string.
+        The output is readable by load_state / from_json.
+        """
+        def write_list(values):
+            fp.write("[")
+            for i, v in enumerate(values):
+                if i:
+                    fp.write(", ")
+                fp.write(_dumps(v))
+            fp.write("]")
+
+        def write_dict(pairs):
+            fp.write("{")
+            for i, (k, v) in enumerate(pairs):
+                if i:
+                    fp.write(", ")
+                fp.write(_dumps(str(k)))
+                fp.write(": ")
+                fp.write(_dumps(v))
+            fp.write("}")
+
+        sections = [
+            ("pending_questions", write_list, self.pending_questions),
+            ("user_answers", write_dict, self._user_answers.items()),
+            ("question_meta", write_dict, self._question_meta.items()),
+            ("asked_question_ids", write_list, self.asked_question_ids),
+            ("disease_boosts", write_dict, self._disease_boosts.items()),
+            ("_questions_by_disease", write_dict, ((k, list(v)) for k, v in self._questions_by_disease.items())),
+        ]
+        fp.write("{")
+        for name, writer, values in sections:
+            fp.write(f'"{name}": ')
+            writer(values)
+            fp.write(", ")
+        fp.write(f'"_seq_counter": {_dumps(self._seq_counter)}, ')
+        fp.write(f'"negative_boost_multiplier": {_dumps(self.negative_boost_multiplier)}}}')
+
+    def load_state(self, fp):
+        """Import state from a text file object written by dump_state (or containing to_json output)."""
+        self.from_json(fp.read())
+
+    def to_msgpack(self) -> bytes:
+        """Return exported state as msgpack bytes (smaller and faster to parse than JSON)."""
+        if msgpack is None:
+            raise ImportError("msgpack is not installed. Use to_json() or 'pip install msgpack'.")
+        return msgpack.packb(self._export_snapshot(), use_bin_type=True)
+
+    def from_msgpack(self, buf: Optional[bytes]):
+        """Import state from msgpack bytes safely (same validation as from_json)."""
+        if not buf:
+            return
+        if msgpack is None:
+            raise ImportError("msgpack is not installed. Use from_json() or 'pip install msgpack'.")
+        try:
+            self.import_state(msgpack.unpackb(buf, raw=False))
+        except Exception:
+            try:
+                self.clear()
+            except Exception:
+                pass
+
     # ---------------- dynamic loading from knowledge base ----------------
 
     def generate_followup_questions_from_kb(self, knowledge_base: dict):
@@ -438,47 +748,39 @@ class FollowUpManager:
         Auto-generate follow-up questions dynamically from the knowledge base.
         NOTE: knowledge_base is expected to be kb_lookup: {disease_name: [list_of_rules]}
         """
-        question_templates = [
-            "Are you experiencing {symptom}?",
-            "Do you have {symptom}?",
-            "Have you been suffering from {symptom} recently?",
-            "Do you notice any {symptom}?",
-            "Have you felt {symptom} in the past few days?"
-        ]
-
         seen_symptoms = set()
-        generated_questions = []
+        pairs = []  # (disease, symptom), at most 3 new symptoms per disease
 
         for disease, rules_list in knowledge_base.items():
-
-            all_disease_symptoms = set()
-            for rule in rules_list:
-                for symptom in rule.get("symptoms", []):
-                    all_disease_symptoms.add(symptom)
-
-            symptoms_list = list(all_disease_symptoms)
+            symptoms_list = list({_intern(symptom) for rule in rules_list for symptom in rule.get("symptoms", [])})
             random.shuffle(symptoms_list)
 
             symptoms_added_for_this_disease = 0
             for symptom in symptoms_list:
                 if symptoms_added_for_this_disease >= 3:
                     break
-
                 if symptom not in seen_symptoms:
                     seen_symptoms.add(symptom)
+                    pairs.append((disease, symptom))
+                    symptoms_added_for_this_disease += 1
 
-                    question_text = random.choice(question_templates).format(symptom=symptom)
-                    q_id = f"{disease}_{symptom.replace(' ', '_')}"
+        # ✅ Draw all templates and severities in two vectorized calls instead of per question
+        n = len(pairs)
+        template_idx = np.random.randint(0, len(_QUESTION_TEMPLATES), size=n).tolist()
+        severities = np.random.randint(1, 6, size=n).tolist()
 
-                    generated_questions.append({
-                        "id": q_id,
-                        "disease": disease,
-                        "question": question_text,
-                        "text": question_text,
-                        "symptom": symptom,
-                        "severity": random.randint(1, 5)
-                    })
-                    symptoms_added_for_this_disease += 1
+        generated_questions = []
+        for (disease, symptom), t_idx, severity in zip(pairs, template_idx, severities):
+            prefix, suffix = _QUESTION_TEMPLATES[t_idx]
+            question_text = prefix + symptom + suffix
+            generated_questions.append({
+                "id": sys.intern(f"{disease}_{symptom.replace(' ', '_')}"),
+                "disease": disease,
+                "question": question_text,
+                "text": question_text,
+                "symptom": symptom,
+                "severity": severity
+            })
 
         if generated_questions:
             self.add_questions(generated_questions)
@@ -504,12 +806,16 @@ class FollowUpManager:
         else:
             return {"status": "error", "message": f"KB path not found: {kb_path}"}
 
+        # ✅ Read/parse several KB files concurrently (file I/O releases the GIL); merge in order below
+        if len(files_to_load) > 1:
+            with ThreadPoolExecutor(max_workers=min(8, len(files_to_load))) as ex:
+                kbs = list(ex.map(self._read_kb_file, files_to_load))
+        else:
+            kbs = [self._read_kb_file(fp) for fp in files_to_load]
+
         total_added = 0
-        for fp in files_to_load:
-            try:
-                with open(fp, "r", encoding="utf-8") as f:
-                    kb = json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
+        for kb in kbs:
+            if kb is None:
                 continue
 
             all_questions: List[Dict[str, Any]] = []
@@ -520,7 +826,7 @@ class FollowUpManager:
 
                 for q in rule.get("follow_ups", []):
                     question_text = q.get("question") or q.get("text") or ""
-                    qid = q.get("id") or q.get("qid") or f"kb_{abs(hash(question_text))}"
+                    qid = q.get("id") or q.get("qid") or f"kb_{_stable_text_id(question_text)}"
                     severity = int(q.get("severity", 5) or 5)
                     q_obj = {
                         "id": qid,
@@ -538,29 +844,70 @@ class FollowUpManager:
                 total_added += added
 
         if total_added > 0:
-            self._reorder_queue()
             return {"status": "ok", "count": total_added}
         return {"status": "empty", "message": "No follow-up questions found in provided KB(s)."}
 
+    @classmethod
+    def _read_kb_file(cls, fp: str) -> Optional[Dict[str, Any]]:
+        """
+        Parse a KB JSON file, reusing the cached result while the file is unchanged.
+        If msgpack is installed and an up-to-date '.msgpack' sibling exists
+        (same name, not older than the JSON), read that instead.
+        Returns None if the file cannot be read or parsed.
+        """
+        try:
+            st = os.stat(fp)
+        except OSError:
+            return None
+        cached = cls._kb_cache.get(fp)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2]
+
+        kb = cls._parse_kb_file(fp)
+        if kb is not None:
+            cls._kb_cache[fp] = (st.st_mtime_ns, st.st_size, kb)
+        return kb
+
+    @staticmethod
+    def _parse_kb_file(fp: str) -> Optional[Dict[str, Any]]:
+        """Read a KB file from disk (preferring a fresh '.msgpack' sibling). None on failure."""
+        if msgpack is not None:
+            packed_fp = os.path.splitext(fp)[0] + ".msgpack"
+            try:
+                if os.path.getmtime(packed_fp) >= os.path.getmtime(fp):
+                    with open(packed_fp, "rb") as f:
+                        kb = msgpack.unpack(f, raw=False)
+                    if isinstance(kb, dict):
+                        return kb
+            except Exception:
+                pass # No usable binary copy; fall back to JSON
+
+        try:
+            with open(fp, "r", encoding="utf-8") as f:
+                kb = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return kb if isinstance(kb, dict) else None
+
     # ---------------- progress / diagnostics ----------------
     def summarize_progress(self) -> Dict[str, Any]:
         """
         Return a diagnostic summary.
         """
-        total_pending = len(self.pending_questions)
-        total_answered = len(self.user_answers)
+        total_pending = len(self._pending_items)
+        total_answered = len(self._user_answers)
 
         answers_by_type: Dict[str, int] = {}
-        for v in self.user_answers.values():
+        for v in self._user_answers.values():
             ans = v.get("answer") if isinstance(v, dict) else v
             answers_by_type[ans] = answers_by_type.get(ans, 0) + 1
 
         pending_per_disease: Dict[str, int] = {}
-        for q in self.pending_questions:
-            d = q.get("disease") or "unknown"
+        for q in self._pending_items.values():
+            d = q.disease or "unknown"
             pending_per_disease[d] = pending_per_disease.get(d, 0) + 1
 
-        top = sorted(self.disease_boosts.items(), key=lambda x: x[1], reverse=True)[:10]
+        top = heapq.nlargest(10, self._disease_boosts.items(), key=lambda x: x[1])
         top_diseases = [{"disease": d, "boost": b} for d, b in top]
 
         return {
@@ -574,12 +921,19 @@ class FollowUpManager:
     # ---------------- utilities ----------------
     def clear(self):
         """Reset manager to an empty safe state."""
-        self.pending_questions.clear()
-        self.user_answers.clear()
-        self.question_meta.clear()
+        self._pending_heap.clear()
+        self._pending_items.clear()
+        self._disease_heaps.clear()
+        self._user_answers.clear()
+        self._question_meta.clear()
         self.asked_question_ids.clear()
-        self.disease_boosts.clear()
+        self._disease_boosts.clear()
         self._questions_by_disease.clear()
+        self._question_boosts.clear()
+        self._disease_to_boost_entries.clear()
+        self._disease_total_possible.clear()
+        self._invalidate_scores()
+        self._dirty = True
         self._seq_counter = 0
         self.negative_boost_multiplier = float(self.negative_boost_multiplier or -0.25)
 
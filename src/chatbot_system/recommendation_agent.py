@@ -1,63 +1,259 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import Dict, List, Set, Optional # Added Optional
+from typing import Dict, List, Optional # Added Optional
+import os
 import re
+import pickle
+import tempfile
+import functools
+import threading
+import math
+from bisect import bisect_left, bisect_right
 from difflib import get_close_matches # ✅ Import for fuzzy matching
 
+# Reads Parquet copies of the data files when enabled (CHATBOT_USE_PARQUET, see scripts/convert_to_parquet.py)
+try:
+    from src.utils.data_io import read_table
+except ImportError:
+    def read_table(csv_path, **read_csv_kwargs):
+        return pd.read_csv(csv_path, **read_csv_kwargs)
+
+# Optional: RapidFuzz (C++) for fuzzy matching; difflib is used if it is missing
+try:
+    from rapidfuzz import process as rf_process, fuzz as rf_fuzz
+except ImportError:
+    rf_process = rf_fuzz = None
+
+# Optional: Aho–Corasick automaton over the keys for the "key inside input" partial match
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Precompiled once; used by _standardize_name on every lookup
+_WS_RE = re.compile(r'\s+')
+
+
+class _KeyIndex:
+    """
+    Substring lookups over a fixed list of map keys, built once.
+    - "input inside key": one C-level str.find scan over all keys joined with NUL separators.
+    - "key inside input": an Aho–Corasick pass over the input (plain scan without pyahocorasick).
+    - Fuzzy candidates: keys whose length can still reach the similarity cutoff, via bisect on sorted lengths.
+    Ties go to the earlier key, like min()/max() over the key list.
+    """
+    __slots__ = ("keys", "_joined", "_starts", "_automaton", "_len_order", "_sorted_lens")
+
+    _SEP = "\x00"
+
+    def __init__(self, keys):
+        self.keys: List[str] = list(keys)
+        self._joined = self._SEP.join(self.keys)
+        self._starts: List[int] = []
+        pos = 0
+        for key in self.keys:
+            self._starts.append(pos)
+            pos += len(key) + 1
+        self._automaton = None
+        if ahocorasick is not None and self.keys:
+            automaton = ahocorasick.Automaton()
+            for i, key in enumerate(self.keys):
+                automaton.add_word(key, i)
+            automaton.make_automaton()
+            self._automaton = automaton
+        self._len_order: List[int] = sorted(range(len(self.keys)), key=lambda i: len(self.keys[i]))
+        self._sorted_lens: List[int] = [len(self.keys[i]) for i in self._len_order]
+
+    def fuzzy_candidates(self, name: str, cutoff: float) -> List[str]:
+        """
+        Keys that can score >= cutoff on the ratio 2*M/(len(a)+len(b)), in original key order.
+        M <= the shorter length, so a key of length k needs c*L/(2-c) <= k <= L*(2-c)/c.
+        """
+        if cutoff <= 0:
+            return self.keys
+        length = len(name)
+        lo = math.ceil(cutoff * length / (2 - cutoff) - 1e-9)
+        hi = math.floor(length * (2 - cutoff) / cutoff + 1e-9)
+        i0, i1 = bisect_left(self._sorted_lens, lo), bisect_right(self._sorted_lens, hi)
+        if i1 - i0 == len(self.keys):
+            return self.keys
+        # Back to original order so fuzzy-match ties resolve exactly as over the full key list
+        return [self.keys[i] for i in sorted(self._len_order[i0:i1])]
+
+    def _shortest_containing(self, name: str) -> Optional[str]:
+        """Shortest key that contains name."""
+        if not name or self._SEP in name:
+            return min((k for k in self.keys if name in k), key=len, default=None)
+        best_i = None
+        pos = self._joined.find(name)
+        while pos != -1:
+            i = bisect_right(self._starts, pos) - 1
+            if best_i is None or len(self.keys[i]) < len(self.keys[best_i]):
+                best_i = i
+            if i + 1 >= len(self._starts):
+                break
+            pos = self._joined.find(name, self._starts[i + 1]) # next key; separators keep hits inside one key
+        return self.keys[best_i] if best_i is not None else None
+
+    def _longest_contained(self, name: str) -> Optional[str]:
+        """Longest key that occurs inside name."""
+        if self._automaton is None:
+            return max((k for k in self.keys if k in name), key=len, default=None)
+        best_i = None
+        for _, i in self._automaton.iter(name):
+            if best_i is None or len(self.keys[i]) > len(self.keys[best_i]) or \
+                    (len(self.keys[i]) == len(self.keys[best_i]) and i < best_i):
+                best_i = i
+        return self.keys[best_i] if best_i is not None else None
+
+    def partial_match(self, name: str):
+        """(shortest key containing name, else longest key contained in name); unmatched side is None."""
+        best_in = self._shortest_containing(name)
+        if best_in is not None:
+            return best_in, None
+        return None, self._longest_contained(name)
+
+
 class RecommendationAgent:
     """
     Provides comprehensive recommendations for a given disease.
-    - Loads data on initialization and uses dictionaries for fast lookups.
+    - Loads data lazily on first use and uses dictionaries for fast lookups.
     - Standardizes disease names for reliable matching.
     - ✅ Includes fallback for partial AND fuzzy disease name matches.
     - ✅ Uses a static method for name standardization.
     - ✅ Added __repr__ for better debugging.
     """
 
-    def __init__(self, fuzzy_match_cutoff: float = 0.8): # Added cutoff parameter
+    MAP_CACHE_NAME = ".reco_cache.pkl"
+    # Stored in the pickle; bump whenever _standardize_name or the map layout changes so old caches are rebuilt
+    MAP_CACHE_VERSION = 1
+
+    def __init__(self, fuzzy_match_cutoff: float = 0.8, use_map_cache: bool = False): # Added cutoff parameter
         """
-        Initializes the agent, loads data files, processes them into lookup maps.
+        Initializes the agent; data files are loaded into lookup maps on first use.
 
         Args:
             fuzzy_match_cutoff: Similarity threshold (0.0 to 1.0) for fuzzy matching.
+            use_map_cache: Reuse/write a pickle of the built maps in data/ (rebuilt when a CSV or MAP_CACHE_VERSION changes).
         """
         base_dir = Path(__file__).resolve().parents[2] # Assumes this file is in chatbot_system
-        data_dir = base_dir / "data"
+        self._data_dir = base_dir / "data"
+        self._use_map_cache = use_map_cache
 
-        self.precaution_map: Dict[str, List[str]] = {}
-        self.description_map: Dict[str, str] = {}
+        self._precaution_map: Dict[str, List[str]] = {}
+        self._description_map: Dict[str, str] = {}
         self.fuzzy_match_cutoff: float = max(0.0, min(1.0, fuzzy_match_cutoff)) # Ensure cutoff is valid
 
-        # --- Load and Process Precautions Data ---
+        # ✅ CSV/cache loading is deferred to the first lookup (see _ensure_loaded)
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+        # Details per standardized name, memoized; cleared whenever a map is reassigned (see _assign_map)
+        self._details_for_key = functools.lru_cache(maxsize=1024)(self._compute_details)
+
+    @property
+    def precaution_map(self) -> Dict[str, List[str]]:
+        self._ensure_loaded()
+        return self._precaution_map
+
+    @precaution_map.setter
+    def precaution_map(self, value: Dict[str, List[str]]):
+        self._assign_map("_precaution_map", value)
+
+    @property
+    def description_map(self) -> Dict[str, str]:
+        self._ensure_loaded()
+        return self._description_map
+
+    @description_map.setter
+    def description_map(self, value: Dict[str, str]):
+        self._assign_map("_description_map", value)
+
+    def _assign_map(self, attr: str, value: Dict):
+        """Replace a lookup map: the other map is loaded first (so no later lazy load overwrites
+        the assigned one), then the key indexes are rebuilt and memoized details dropped."""
+        with self._load_lock:
+            if not self._loaded:
+                self._load_data()
+                self._loaded = True
+            setattr(self, attr, value)
+            self._build_indexes()
+            self._details_for_key.cache_clear()
+
+    def _ensure_loaded(self):
+        """Load the data on first use; double-checked so concurrent first calls load only once."""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self._load_data()
+                self._loaded = True
+
+    def _load_data(self):
+        """Build both lookup maps (from the pickle cache or the CSVs) and their key indexes."""
+        data_dir = self._data_dir
+        precaution_file = data_dir / "symptom_precaution.csv"
+        description_file = data_dir / "symptom_Description.csv"
+        cache_file = data_dir / self.MAP_CACHE_NAME
+        use_map_cache = self._use_map_cache
+
+        # --- Load and Process Data (or reuse the pickled maps if the CSVs are unchanged) ---
+        if not (use_map_cache and self._load_map_cache(cache_file, precaution_file, description_file)):
+            self._load_precaution_map(precaution_file)
+            self._load_description_map(description_file)
+            if use_map_cache:
+                self._save_map_cache(cache_file, precaution_file, description_file)
+        # --- End Load and Process Data ---
+
+        self._build_indexes()
+
+    def _build_indexes(self):
+        """Key lists for fallback matching, built once per map instead of on every lookup miss."""
+        self._precaution_index = _KeyIndex(self._precaution_map)
+        self._description_index = _KeyIndex(self._description_map)
+        self._all_disease_index = _KeyIndex(dict.fromkeys([*self._precaution_map, *self._description_map]))
+
+
+    # ==========================
+    # 🔹 Data loading (CSV -> lookup maps)
+    # ==========================
+    def _load_precaution_map(self, precaution_file: Path):
+        """Build precaution_map from the wide precautions CSV."""
         try:
-            precaution_file = data_dir / "symptom_precaution.csv"
-            df_prec = pd.read_csv(precaution_file)
+            # Text-only file: read just the disease/precaution columns as str (no type inference)
+            df_prec = read_table(
+                precaution_file, engine="c", dtype=str,
+                usecols=lambda c: str(c).strip().lower() == 'disease' or 'precaution' in str(c).strip().lower(),
+            )
             df_prec.columns = [str(col).strip().lower() for col in df_prec.columns]
 
             if 'disease' in df_prec.columns:
                 # ✅ Use static method for standardization
-                df_prec['disease_clean'] = df_prec['disease'].apply(self._standardize_name)
+                df_prec['disease_clean'] = self._standardize_series(df_prec['disease'])
                 # Drop rows where disease name became empty after cleaning
                 df_prec.dropna(subset=['disease_clean'], inplace=True)
                 df_prec = df_prec[df_prec['disease_clean'] != '']
 
                 precaution_cols = [col for col in df_prec.columns if 'precaution' in col]
 
-                # Group by cleaned disease name to collect all precautions
-                grouped = df_prec.groupby('disease_clean')
-
-                for disease_key, group in grouped:
-                    precautions_set: Set[str] = set()
-                    for _, row in group.iterrows():
-                        for col in precaution_cols:
-                            precaution_text = row.get(col)
-                            if pd.notna(precaution_text) and str(precaution_text).strip():
-                                cleaned_prec = str(precaution_text).strip().capitalize()
-                                precautions_set.add(cleaned_prec)
-                    if precautions_set:
-                        self.precaution_map[disease_key] = sorted(list(precautions_set))
-
-                print(f"✅ RecommendationAgent: Precautions data loaded and mapped for {len(self.precaution_map)} diseases.")
+                # ✅ Vectorized: wide -> long (one row per precaution cell), clean, then collect per disease
+                if precaution_cols:
+                    long_prec = df_prec.melt(id_vars=['disease_clean'], value_vars=precaution_cols,
+                                             value_name='precaution_text').dropna(subset=['precaution_text'])
+                    long_prec['precaution_text'] = long_prec['precaution_text'].astype(str).str.strip().str.capitalize()
+                    long_prec = long_prec[long_prec['precaution_text'] != '']
+                    # ✅ Group with NumPy: integer disease codes, stable sort, then slice each disease's segment
+                    codes, diseases = pd.factorize(long_prec['disease_clean'].to_numpy(), sort=True)
+                    order = np.argsort(codes, kind='stable')
+                    precs_sorted = long_prec['precaution_text'].to_numpy()[order]
+                    bounds = np.searchsorted(codes[order], np.arange(len(diseases) + 1))
+                    self._precaution_map = {
+                        diseases[i]: sorted(set(precs_sorted[bounds[i]:bounds[i + 1]]))
+                        for i in range(len(diseases))
+                    }
+
+                print(f"✅ RecommendationAgent: Precautions data loaded and mapped for {len(self._precaution_map)} diseases.")
             else:
                 print(f"⚠️ RecommendationAgent: Precaution file ({precaution_file.name}) missing 'disease' column.")
 
@@ -66,10 +262,14 @@ class RecommendationAgent:
         except Exception as e:
             print(f"⚠️ RecommendationAgent: Error loading/processing precaution data: {e}")
 
-        # --- Load and Process Descriptions Data ---
+
+    def _load_description_map(self, description_file: Path):
+        """Build description_map from the descriptions CSV."""
         try:
-            description_file = data_dir / "symptom_Description.csv"
-            df_desc = pd.read_csv(description_file)
+            df_desc = read_table(
+                description_file, engine="c", dtype=str,
+                usecols=lambda c: str(c).strip().lower() in ('disease', 'symptom', 'description'),
+            )
             df_desc.columns = [str(col).strip().lower() for col in df_desc.columns]
 
             # Handle potential misnaming ('symptom' instead of 'disease')
@@ -79,7 +279,7 @@ class RecommendationAgent:
 
             if 'disease' in df_desc.columns and 'description' in df_desc.columns:
                 # ✅ Use static method for standardization
-                df_desc['disease_clean'] = df_desc['disease'].apply(self._standardize_name)
+                df_desc['disease_clean'] = self._standardize_series(df_desc['disease'])
                 # Drop rows if disease name or description is empty after cleaning/conversion
                 df_desc.dropna(subset=['disease_clean', 'description'], inplace=True)
                 df_desc = df_desc[df_desc['disease_clean'] != '']
@@ -88,12 +288,12 @@ class RecommendationAgent:
 
                 # Create map, keeping only the first entry if duplicates exist for disease_clean
                 df_desc_unique = df_desc.drop_duplicates(subset=['disease_clean'], keep='first')
-                self.description_map = pd.Series(
+                self._description_map = pd.Series(
                     df_desc_unique.description.values,
                     index=df_desc_unique.disease_clean
                 ).to_dict()
 
-                print(f"✅ RecommendationAgent: Descriptions data loaded and mapped for {len(self.description_map)} diseases.")
+                print(f"✅ RecommendationAgent: Descriptions data loaded and mapped for {len(self._description_map)} diseases.")
             else:
                 print(f"⚠️ RecommendationAgent: Description file ({description_file.name}) missing required 'disease' or 'description' columns.")
 
@@ -101,7 +301,51 @@ class RecommendationAgent:
             print(f"⚠️ RecommendationAgent: Description file not found at {description_file}.")
         except Exception as e:
             print(f"⚠️ RecommendationAgent: Error loading/processing description data: {e}")
-        # --- End Load and Process Data ---
+
+    @staticmethod
+    def _source_signature(*files: Path):
+        """(mtime_ns, size) of each source file; None if any is missing."""
+        try:
+            return tuple((f.stat().st_mtime_ns, f.stat().st_size) for f in files)
+        except OSError:
+            return None
+
+    def _load_map_cache(self, cache_file: Path, *source_files: Path) -> bool:
+        """Load both maps from the pickle cache if it was built from the current CSVs by the current format."""
+        signature = self._source_signature(*source_files)
+        if signature is None or not cache_file.exists():
+            return False
+        try:
+            with cache_file.open("rb") as f:
+                cached = pickle.load(f)
+            if cached.get("version") != self.MAP_CACHE_VERSION or cached.get("sources") != signature:
+                return False
+            self._precaution_map = cached["prec"]
+            self._description_map = cached["desc"]
+        except Exception as e:
+            print(f"⚠️ RecommendationAgent: Ignoring unreadable map cache ({cache_file.name}): {e}")
+            return False
+        print(f"✅ RecommendationAgent: Loaded cached maps ({len(self._precaution_map)} precautions, "
+              f"{len(self._description_map)} descriptions).")
+        return True
+
+    def _save_map_cache(self, cache_file: Path, *source_files: Path):
+        """Pickle both maps next to the CSVs (atomic replace); failures only disable caching."""
+        signature = self._source_signature(*source_files)
+        if signature is None or not (self._precaution_map or self._description_map):
+            return
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=cache_file.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump({"version": self.MAP_CACHE_VERSION, "sources": signature,
+                             "prec": self._precaution_map, "desc": self._description_map},
+                            f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_file)
+        except Exception as e:
+            print(f"⚠️ RecommendationAgent: Could not write map cache: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
 
     # ==========================
@@ -110,20 +354,40 @@ class RecommendationAgent:
     @staticmethod
     def _standardize_name(name: str) -> str:
         """Standardizes a disease name (lowercase, strip, underscores to spaces, normalize spaces)."""
+        # Type check before the cache: non-strings (possibly unhashable, e.g. lists) never reach lru_cache
         if not isinstance(name, str):
             return ""
+        return RecommendationAgent._standardize_str(name)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _standardize_str(name: str) -> str:
+        """Memoized body of _standardize_name; only ever called with a str."""
         try:
             # Lowercase, strip leading/trailing whitespace
             s = name.strip().lower()
             # Replace underscores with spaces
             s = s.replace('_', ' ')
             # Replace multiple whitespace characters with a single space
-            s = re.sub(r'\s+', ' ', s)
+            s = _WS_RE.sub(' ', s)
             return s.strip() # Strip again just in case
         except Exception as e:
             print(f"⚠️ Error standardizing name '{name}': {e}")
             return ""
 
+    @staticmethod
+    def _standardize_series(names: pd.Series) -> pd.Series:
+        """Vectorized _standardize_name for a whole column (non-string values become '')."""
+        return (
+            names.astype(object)
+            .str.strip()
+            .str.lower()
+            .str.replace('_', ' ', regex=False)
+            .str.replace(r'\s+', ' ', regex=True)
+            .str.strip()
+            .fillna('')
+        )
+
     # ==========================
     # 🔹 Fuzzy Match Helper
     # ==========================
@@ -131,6 +395,11 @@ class RecommendationAgent:
         """Find the best fuzzy match for a name within a list of options."""
         if not name or not options:
             return None
+        if rf_process is not None:
+            # fuzz.ratio is the same 0-100 similarity scale as difflib's ratio() * 100
+            match = rf_process.extractOne(name, options, scorer=rf_fuzz.ratio,
+                                          score_cutoff=self.fuzzy_match_cutoff * 100)
+            return match[0] if match else None
         # Use get_close_matches to find the best match (n=1)
         matches = get_close_matches(name, options, n=1, cutoff=self.fuzzy_match_cutoff)
         if matches:
@@ -142,72 +411,58 @@ class RecommendationAgent:
     # 🔹 Internal helper methods (Now using map + partial + fuzzy fallback)
     # ==========================
 
-    def _get_precautions(self, disease_name_clean: str) -> List[str]:
-        """Retrieve precautions using map, with partial and fuzzy match fallbacks."""
-        # 1. Try direct match (fastest)
-        result = self.precaution_map.get(disease_name_clean)
-        if result is not None: # Check explicitly for None, as empty list [] is a valid (but empty) result
-            return result
+    # kind -> (map attribute, key index attribute, empty-result factory, label for log messages)
+    _LOOKUP_KINDS = {
+        "prec": ("_precaution_map", "_precaution_index", list, "precautions"),
+        "desc": ("_description_map", "_description_index", str, "description"),
+    }
 
+    def _resolve_key(self, disease_name_clean: str, index: _KeyIndex, label: str) -> Optional[str]:
+        """Partial then fuzzy fallback: the best matching key in the index, or None."""
         # 2. Fallback: Try partial matching (simple substring check)
         # Check only if name is reasonably long to avoid too many false positives
         if len(disease_name_clean) >= 4:
-            # Check if input is substring of any key
-            partial_matches = [key for key in self.precaution_map if disease_name_clean in key]
-            if partial_matches:
-                 # Optional: prioritize shorter keys or exact word matches if multiple partial found
-                 best_partial = min(partial_matches, key=len) # Simple heuristic: shortest key is often better
-                 print(f"ℹ️ RecommendationAgent: Partial match found for precautions: '{disease_name_clean}' -> '{best_partial}'")
-                 return self.precaution_map.get(best_partial, [])
-
-            # Check if any key is substring of input (less common but possible)
-            key_as_substring = [key for key in self.precaution_map if key in disease_name_clean]
-            if key_as_substring:
-                 best_key_substring = max(key_as_substring, key=len) # Longest key match
-                 print(f"ℹ️ RecommendationAgent: Partial match (key in input) found for precautions: '{disease_name_clean}' -> '{best_key_substring}'")
-                 return self.precaution_map.get(best_key_substring, [])
+            # Input as substring of a key (shortest key wins), else key as substring of input (longest wins)
+            best_partial, best_key_substring = index.partial_match(disease_name_clean)
+            if best_partial:
+                 print(f"ℹ️ RecommendationAgent: Partial match found for {label}: '{disease_name_clean}' -> '{best_partial}'")
+                 return best_partial
 
+            if best_key_substring:
+                 print(f"ℹ️ RecommendationAgent: Partial match (key in input) found for {label}: '{disease_name_clean}' -> '{best_key_substring}'")
+                 return best_key_substring
 
         # 3. Fallback: Try fuzzy matching
-        fuzzy_key = self._fuzzy_match(disease_name_clean, list(self.precaution_map.keys()))
+        # Only keys whose length can still reach the cutoff are scored
+        fuzzy_key = self._fuzzy_match(disease_name_clean, index.fuzzy_candidates(disease_name_clean, self.fuzzy_match_cutoff))
         if fuzzy_key:
-             print(f"ℹ️ RecommendationAgent: Fuzzy match found for precautions: '{disease_name_clean}' -> '{fuzzy_key}' (Score > {self.fuzzy_match_cutoff})")
-             return self.precaution_map.get(fuzzy_key, []) # Get precautions for the fuzzy matched key
+             print(f"ℹ️ RecommendationAgent: Fuzzy match found for {label}: '{disease_name_clean}' -> '{fuzzy_key}' (Score > {self.fuzzy_match_cutoff})")
+             return fuzzy_key
 
         # 4. Not found
-        # print(f"_get_precautions: No match found for '{disease_name_clean}'") # For debugging
-        return []
+        return None
 
-    def _get_description(self, disease_name_clean: str) -> str:
-        """Retrieve description using map, with partial and fuzzy match fallbacks."""
-        # 1. Try direct match
-        result = self.description_map.get(disease_name_clean)
-        if result is not None: # Check for None, empty string "" is a valid description
+    def _lookup(self, disease_name_clean: str, kind: str):
+        """Map lookup with partial and fuzzy match fallbacks, shared by precautions and descriptions."""
+        self._ensure_loaded()
+        map_attr, index_attr, empty, label = self._LOOKUP_KINDS[kind]
+        lookup_map = getattr(self, map_attr)
+
+        # 1. Try direct match (fastest)
+        result = lookup_map.get(disease_name_clean)
+        if result is not None: # Check explicitly for None: [] / "" are valid (but empty) results
             return result
 
-        # 2. Fallback: Try partial matching
-        if len(disease_name_clean) >= 4:
-             partial_matches = [key for key in self.description_map if disease_name_clean in key]
-             if partial_matches:
-                  best_partial = min(partial_matches, key=len)
-                  print(f"ℹ️ RecommendationAgent: Partial match found for description: '{disease_name_clean}' -> '{best_partial}'")
-                  return self.description_map.get(best_partial, "")
-
-             key_as_substring = [key for key in self.description_map if key in disease_name_clean]
-             if key_as_substring:
-                  best_key_substring = max(key_as_substring, key=len)
-                  print(f"ℹ️ RecommendationAgent: Partial match (key in input) found for description: '{disease_name_clean}' -> '{best_key_substring}'")
-                  return self.description_map.get(best_key_substring, "")
+        matched_key = self._resolve_key(disease_name_clean, getattr(self, index_attr), label)
+        return lookup_map.get(matched_key, empty()) if matched_key else empty()
 
-        # 3. Fallback: Try fuzzy matching
-        fuzzy_key = self._fuzzy_match(disease_name_clean, list(self.description_map.keys()))
-        if fuzzy_key:
-            print(f"ℹ️ RecommendationAgent: Fuzzy match found for description: '{disease_name_clean}' -> '{fuzzy_key}' (Score > {self.fuzzy_match_cutoff})")
-            return self.description_map.get(fuzzy_key, "") # Get description for the fuzzy matched key
+    def _get_precautions(self, disease_name_clean: str) -> List[str]:
+        """Retrieve precautions using map, with partial and fuzzy match fallbacks."""
+        return self._lookup(disease_name_clean, "prec")
 
-        # 4. Not found
-        # print(f"_get_description: No match found for '{disease_name_clean}'") # For debugging
-        return ""
+    def _get_description(self, disease_name_clean: str) -> str:
+        """Retrieve description using map, with partial and fuzzy match fallbacks."""
+        return self._lookup(disease_name_clean, "desc")
 
 
     # ==========================
@@ -225,10 +480,22 @@ class RecommendationAgent:
         """Retrieves a dictionary with all available details using fast lookups + fallback."""
         # Standardize the input disease name for consistent lookup
         disease_key = self._standardize_name(disease_name)
-
-        # Get data using internal methods which handle fallbacks
-        precautions = self._get_precautions(disease_key) if disease_key else []
-        description = self._get_description(disease_key) if disease_key else ""
+        self._ensure_loaded()
+        # ✅ Memoized per key; return a shallow copy so callers can't alter the cached entry
+        return dict(self._details_for_key(disease_key))
+
+    def _compute_details(self, disease_key: str) -> Dict:
+        """Build the details dict for an already-standardized disease key."""
+        # ✅ Resolve the canonical disease once (one partial/fuzzy pass over both maps' keys),
+        # then two O(1) lookups — both maps share the same standardized disease names
+        if not disease_key:
+            canonical = None
+        elif disease_key in self._precaution_map or disease_key in self._description_map:
+            canonical = disease_key
+        else:
+            canonical = self._resolve_key(disease_key, self._all_disease_index, "details")
+        precautions = self._precaution_map.get(canonical, []) if canonical else []
+        description = self._description_map.get(canonical, "") if canonical else ""
 
         # Default messages if data not found even after fallbacks
         if not precautions:
@@ -256,8 +523,10 @@ class RecommendationAgent:
     # ==========================
     def __repr__(self):
         """Readable representation of the agent's loaded data state."""
-        return (f"<RecommendationAgent: {len(self.precaution_map)} diseases with precautions, "
-                f"{len(self.description_map)} with descriptions>")
+        if not self._loaded:
+            return "<RecommendationAgent: data not loaded yet>"
+        return (f"<RecommendationAgent: {len(self._precaution_map)} diseases with precautions, "
+                f"{len(self._description_map)} with descriptions>")
 
 # Example Usage (optional) - updated for fuzzy matching test
 if __name__ == '__main__':
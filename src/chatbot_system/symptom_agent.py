@@ -1,8 +1,26 @@
 import re
+import sys
 import pandas as pd
 from pathlib import Path
 from typing import List, Set, Optional
 
+# Reads a Parquet copy of the symptom list when enabled (CHATBOT_USE_PARQUET, see scripts/convert_to_parquet.py)
+try:
+    from src.utils.data_io import read_table
+except ImportError:
+    def read_table(csv_path, **read_csv_kwargs):
+        return pd.read_csv(csv_path, **read_csv_kwargs)
+
+# Optional: Aho–Corasick automaton (pyahocorasick) to find all symptoms in one pass over the text
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Patterns for the fallback cleaner, compiled once at import
+_NONWORD_RE = re.compile(r"[^a-zA-Z\u0621-\u064A\s_]")
+_WS_RE = re.compile(r"\s+")
+
 # --- Import TextCleaner ---
 try:
     from src.utils.text_cleaner import TextCleaner
@@ -11,10 +29,13 @@ except ImportError:
     class TextCleaner:
         def transform(self, text):
             text = str(text).lower().strip()
-            text = re.sub(r"[^a-zA-Z\u0621-\u064A\s_]", "", text)
-            text = re.sub(r"\s+", " ", text)
+            text = _NONWORD_RE.sub("", text)
+            text = _WS_RE.sub(" ", text)
             return text
 
+# Arabic alef variants -> bare alef, underscores -> spaces (one C-level pass via str.translate)
+_NORM_TABLE = str.maketrans({"إ": "ا", "أ": "ا", "آ": "ا", "_": " "})
+
 
 class SymptomAgent:
     """
@@ -28,6 +49,8 @@ class SymptomAgent:
         self.collected_symptoms_session: Set[str] = set()
         self.raw_user_input: str = ""
         self.max_ngram = max_ngram
+        self._symptom_automaton = self._build_symptom_automaton()
+        self._symptom_re = self._build_symptom_regex()
         if not self.symptom_set:
             print(f"⚠️ SymptomAgent initialized with an EMPTY symptom list from {symptom_list_path}. Extraction will likely fail.")
 
@@ -44,7 +67,7 @@ class SymptomAgent:
                 print(f"❌ Error: Symptom list file not found at calculated path: {full_path}")
                 return set()
 
-            df = pd.read_csv(full_path)
+            df = read_table(full_path)
             symptom_col = next((col for col in df.columns if col.strip().lower() == 'symptom'), None)
             if symptom_col is None:
                 print(f"❌ Error: 'symptom' column not found in {full_path}.")
@@ -52,12 +75,43 @@ class SymptomAgent:
 
             symptoms_series = df[symptom_col].dropna().astype(str)
             cleaned_symptoms = [self.text_cleaner.transform(s) for s in symptoms_series]
-            return {s.strip() for s in cleaned_symptoms if s}
+            # Interned: extracted/session symptoms then share these objects (identity-fast set lookups)
+            return {sys.intern(s.strip()) for s in cleaned_symptoms if s}
 
         except Exception as e:
             print(f"❌ Error loading/cleaning symptom list from {path}: {e}")
             return set()
 
+    def _build_symptom_automaton(self):
+        """Aho–Corasick automaton over the normalized symptoms (None if pyahocorasick is unavailable)."""
+        if ahocorasick is None or not self.symptom_set:
+            return None
+        try:
+            automaton = ahocorasick.Automaton()
+            for symptom in self.symptom_set:
+                normalized_symptom = sys.intern(symptom.replace("_", " "))
+                automaton.add_word(normalized_symptom, normalized_symptom)
+            automaton.make_automaton()
+            return automaton
+        except Exception as e:
+            print(f"⚠️ Could not build symptom automaton, using regex matching: {e}")
+            return None
+
+    def _build_symptom_regex(self) -> Optional["re.Pattern"]:
+        """
+        One alternation over all symptoms (longest first), wrapped in a lookahead so
+        every word start yields its longest symptom match, overlaps included.
+        """
+        if not self.symptom_set:
+            return None
+        normalized = sorted({s.replace("_", " ") for s in self.symptom_set}, key=len, reverse=True)
+        return re.compile(r"(?=\b(" + "|".join(map(re.escape, normalized)) + r")\b)")
+
+    @staticmethod
+    def _is_word_char(ch: str) -> bool:
+        """Same notion of a word character as regex \\b."""
+        return ch.isalnum() or ch == "_"
+
     # -------------------------------------------------------------------------
     # ✅ Multi-language, multi-word extraction (Arabic + English)
     # -------------------------------------------------------------------------
@@ -65,27 +119,35 @@ class SymptomAgent:
         if not self.symptom_set:
             return []
 
-        # Normalize Arabic and underscores
-        cleaned_text = re.sub(r"[إأآا]", "ا", cleaned_text)
-        cleaned_text = cleaned_text.replace("_", " ")
+        # Normalize Arabic, underscores and whitespace runs (single spaces between words)
+        cleaned_text = " ".join(cleaned_text.translate(_NORM_TABLE).split())
 
         extracted = set()
 
-        # Regex-based extraction for both Arabic & English multi-word symptoms
-        for symptom in self.symptom_set:
-            normalized_symptom = symptom.replace("_", " ")
-            pattern = rf"\b{re.escape(normalized_symptom)}\b"
-            if re.search(pattern, cleaned_text):
-                extracted.add(normalized_symptom)
-
-        # Also check n-grams for flexible detection
-        words = cleaned_text.split()
-        num_words = len(words)
-        for n in range(min(self.max_ngram, num_words), 0, -1):
-            for i in range(num_words - n + 1):
-                phrase = " ".join(words[i:i + n])
-                if phrase in self.symptom_set or phrase.replace(" ", "_") in self.symptom_set:
-                    extracted.add(phrase.replace("_", " "))
+        if self._symptom_automaton is not None:
+            # ✅ One pass over the text; keep only hits on word boundaries (as \b would)
+            text_len = len(cleaned_text)
+            for end, symptom in self._symptom_automaton.iter(cleaned_text):
+                start = end - len(symptom) + 1
+                if start > 0 and self._is_word_char(cleaned_text[start - 1]):
+                    continue
+                if end + 1 < text_len and self._is_word_char(cleaned_text[end + 1]):
+                    continue
+                extracted.add(symptom)
+        else:
+            # Regex-based extraction for both Arabic & English multi-word symptoms (single compiled pattern)
+            extracted.update(self._symptom_re.findall(cleaned_text))
+
+            # The regex yields only the longest symptom per start position, so also check n-grams
+            # to recover shorter ones (e.g. "chest" inside "chest pain"). The automaton needs no
+            # such pass: it reports every word-bounded match.
+            words = cleaned_text.split()
+            num_words = len(words)
+            for n in range(min(self.max_ngram, num_words), 0, -1):
+                for i in range(num_words - n + 1):
+                    phrase = " ".join(words[i:i + n])
+                    if phrase in self.symptom_set or phrase.replace(" ", "_") in self.symptom_set:
+                        extracted.add(phrase.replace("_", " "))
 
         return sorted(list(extracted))
 
@@ -1,4 +1,6 @@
 # D:\disease_prediction_project\src\main.py
+# Run with one worker per core (CPU-bound inference; each worker builds the model/KB structures once at import):
+#   uvicorn src.main:app --workers $(nproc) --host 0.0.0.0 --port 8000
 
 # --- Path modification ---
 import sys, os
@@ -9,11 +11,27 @@ if project_root not in sys.path:
 
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import joblib, json, re
-from typing import List, Dict, Tuple
+import numpy as np
+from scipy import sparse
+import asyncio
+import heapq
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Set, Tuple
+from collections import defaultdict
 import traceback
 
+# Optional: orjson for faster response encoding and KB parsing (falls back to the stdlib json path)
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:
+    orjson = None
+    ORJSONResponse = JSONResponse
+
 # --- Try importing TextCleaner from its new location ---
 try:
     # ✅ This import should now match what the joblib file expects
@@ -25,17 +43,40 @@ except ImportError as import_err:
     TextCleaner = None
     print("⚠️ TextCleaner could not be imported. Model loading will likely fail.")
 
+# ✅ Built once at import instead of per request
+_CLEANER = TextCleaner() if TextCleaner else None
+_WORD_RE = re.compile(r"\b\w+\b")
+_SLUG_RE = re.compile(r"\W+")
+
 
 # --- Initialize FastAPI App ---
 app = FastAPI(
     title="Hybrid Disease Prediction API (v3.4)",
     description="Uses merged dataset + hybrid knowledge-based engine for improved medical predictions.",
     version="3.4.0",
+    default_response_class=ORJSONResponse,
 )
 
+def use_float32(pipeline) -> None:
+    """
+    Switch a loaded pipeline's numeric steps to float32 in place.
+    TF-IDF then emits float32 matrices, which the tree classifier would otherwise copy down to
+    float32 on every call; linear models get float32 coefficients (half the bytes per matmul).
+    """
+    for name, step in getattr(pipeline, "steps", []):
+        if hasattr(step, "dtype") and hasattr(step, "build_analyzer"): # TfidfVectorizer / HashingVectorizer
+            step.dtype = np.float32
+        if hasattr(step, "idf_"): # TfidfVectorizer / TfidfTransformer
+            step.idf_ = np.asarray(step.idf_, dtype=np.float32)
+        if hasattr(step, "coef_"): # Linear classifiers
+            step.coef_ = np.asarray(step.coef_, dtype=np.float32)
+            step.intercept_ = np.asarray(step.intercept_, dtype=np.float32)
+
 # --- Load Model & Encoder ---
 model_pipeline = None
+ml_model = None # What predict_proba runs on: the pipeline minus its TextCleaner step (input is cleaned once per request)
 label_encoder = None
+CLASSES: Tuple[str, ...] = () # label_encoder.classes_ as a tuple, cached once for per-request zips
 if TextCleaner is not None:
     try:
         base_dir = project_root
@@ -48,9 +89,15 @@ if TextCleaner is not None:
         # already knows the correct path: 'src.utils.text_cleaner'
 
         print(f"Attempting to load model from: {model_path}")
-        model_pipeline = joblib.load(model_path) # <<< This should now work
+        # ✅ mmap_mode='r': the (uncompressed) model's numpy arrays are backed by the file, so
+        # uvicorn workers share them through the page cache instead of each holding a copy.
+        model_pipeline = joblib.load(model_path, mmap_mode='r') # <<< This should now work
         print(f"Attempting to load encoder from: {encoder_path}")
-        label_encoder = joblib.load(encoder_path)
+        label_encoder = joblib.load(encoder_path, mmap_mode='r')
+        CLASSES = tuple(label_encoder.classes_)
+        # ✅ Requests are cleaned once in _preprocess; skip the pipeline's own cleaner step
+        ml_model = model_pipeline[1:] if isinstance(model_pipeline.steps[0][1], TextCleaner) else model_pipeline
+        use_float32(model_pipeline)
         print("✅ Model and encoder loaded successfully (v3.4 - Cleaned).")
 
     except FileNotFoundError as fnf_err:
@@ -68,6 +115,23 @@ else:
 
 
 # --- Load Knowledge Base ---
+# Answer -> boost multiplier; any other non-empty answer counts as "unsure"
+NEGATIVE_BOOST_MULTIPLIER = -0.25
+UNSURE_BOOST_MULTIPLIER = 0.5
+ANSWER_MULTIPLIERS = {"yes": 1.0, "y": 1.0, "no": NEGATIVE_BOOST_MULTIPLIER, "n": NEGATIVE_BOOST_MULTIPLIER}
+
+def _parse_boost_values(follow_up: Dict) -> Dict[str, float]:
+    """Lowercased disease -> boost value (first valid entry per disease), parsed once at KB load."""
+    values = {}
+    for boost_item in follow_up.get("boosts", []):
+        name = boost_item.get("name", "").lower()
+        if name in values: continue
+        try:
+            values[name] = float(boost_item.get("value", 0.0))
+        except (ValueError, TypeError):
+            print(f"Warning: Invalid boost value for qid {follow_up.get('id')}: {boost_item}")
+    return values
+
 def preprocess_kb(kb_rules: List[Dict]) -> Dict:
     kb_dict = {}
     for i, rule in enumerate(kb_rules):
@@ -75,22 +139,52 @@ def preprocess_kb(kb_rules: List[Dict]) -> Dict:
         if rule.get("conditions"):
             disease_name_for_id = rule["conditions"][0].get("name", f"rule{i}").lower().replace(" ", "_")
         for j, follow_up in enumerate(rule.get("follow_ups", [])):
-            q_text_slug = re.sub(r'\W+', '_', follow_up.get("question", "")[:20]).lower().strip('_')
+            q_text_slug = _SLUG_RE.sub('_', follow_up.get("question", "")[:20]).lower().strip('_')
             follow_up["id"] = follow_up.get("id") or f"q_{disease_name_for_id}_{q_text_slug}_{j}"
+        # ✅ Request-invariant matching data, computed once here instead of per request
+        rule["_symptom_set"] = frozenset(s.lower() for s in rule.get("symptoms", []))
+        rule["_symptom_len"] = len(rule["_symptom_set"])
+        rule["_conditions"] = tuple((c["name"], c.get("score", 0.5)) for c in rule.get("conditions", []) if c.get("name"))
+        # Parsed boosts per follow-up, parallel to rule["follow_ups"] (kept off the follow-up dicts, which are returned to clients)
+        rule["_boost_values"] = tuple(_parse_boost_values(f) for f in rule.get("follow_ups", []))
         for condition in rule.get("conditions", []):
             disease_name = condition.get("name", "").lower()
             if disease_name: kb_dict.setdefault(disease_name, []).append(rule)
     return kb_dict
 
+def build_rule_matrix(kb_rules: List[Dict]) -> Tuple[Dict[str, int], "sparse.csr_matrix", np.ndarray]:
+    """Symptom vocabulary, a (rules x vocab) 0/1 CSR matrix and each rule's symptom count."""
+    vocab: Dict[str, int] = {}
+    rows, cols = [], []
+    for i, rule in enumerate(kb_rules):
+        for symptom in rule["_symptom_set"]:
+            rows.append(i)
+            cols.append(vocab.setdefault(symptom, len(vocab)))
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float64), (rows, cols)),
+                               shape=(len(kb_rules), len(vocab)))
+    rule_len = np.array([rule["_symptom_len"] for rule in kb_rules], dtype=np.float64)
+    return vocab, matrix, rule_len
+
+def build_token_index(kb_rules: List[Dict]) -> Dict[str, Tuple[int, ...]]:
+    """Inverted index: lowercased symptom -> indices of the rules that list it."""
+    token_to_rules = defaultdict(list)
+    for i, rule in enumerate(kb_rules):
+        for symptom in rule["_symptom_set"]:
+            token_to_rules[symptom].append(i)
+    return {token: tuple(rule_ids) for token, rule_ids in token_to_rules.items()}
+
 knowledge_base, raw_kb_rules = {}, []
+token_to_rules = {}
+rule_vocab, rule_matrix, rule_len = {}, sparse.csr_matrix((0, 0)), np.zeros(0)
 try:
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    kb_path = os.path.join(base_dir, "data", "english_knowledge_base.json")
+    kb_path = os.path.join(project_root, "data", "english_knowledge_base.json")
     print(f"Attempting to load KB from: {kb_path}")
-    with open(kb_path, "r", encoding="utf-8") as f:
-        kb_json = json.load(f)
+    with open(kb_path, "rb") as f:
+        kb_json = orjson.loads(f.read()) if orjson else json.loads(f.read().decode("utf-8"))
         raw_kb_rules = kb_json.get("rules", [])
         knowledge_base = preprocess_kb(raw_kb_rules)
+        rule_vocab, rule_matrix, rule_len = build_rule_matrix(raw_kb_rules)
+        token_to_rules = build_token_index(raw_kb_rules)
         print(f"✅ Knowledge base loaded successfully. {len(knowledge_base)} diseases indexed.")
 except FileNotFoundError:
     print(f"⚠️ KB file not found at {kb_path}. Rules limited.")
@@ -104,69 +198,149 @@ class SymptomRequest(BaseModel):
     top_k: int = 3
     follow_up_answers: Dict[str, str] = {}
 
+class BatchRequest(BaseModel):
+    texts: List[str]
+    top_k: int = 3
+    follow_up_answers: Dict[str, str] = {}
+
+# --- Micro-batching for predict_proba ---
+# Concurrent single-text requests are coalesced into one predict_proba call,
+# so vectorization and the classifier run once per batch instead of once per request.
+MAX_BATCH = 32
+MAX_WAIT_MS = 5
+# Upper bound on texts per /predict_batch request (larger bodies get 413), overridable via env
+MAX_BATCH_TEXTS = int(os.getenv("MAX_BATCH_TEXTS", "256"))
+_pending: List[Tuple[str, asyncio.Future]] = []
+_pending_event = None # Created with the worker: asyncio primitives are bound to one event loop
+_batch_task = None
+
+# Dedicated pool for CPU-bound sklearn inference, so it never waits behind FastAPI's shared threadpool.
+# Created on first use and dropped on shutdown, so a later startup in the same process gets a fresh pool.
+EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+def get_executor() -> ThreadPoolExecutor:
+    global EXECUTOR
+    if EXECUTOR is None:
+        EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="predict")
+    return EXECUTOR
+
+async def batch_worker():
+    loop = asyncio.get_running_loop()
+    while True:
+        await _pending_event.wait()
+        await asyncio.sleep(MAX_WAIT_MS / 1000) # Let concurrent requests join the batch
+        batch = _pending[:MAX_BATCH]
+        del _pending[:MAX_BATCH]
+        if not _pending:
+            _pending_event.clear()
+        if not batch:
+            continue
+        texts = [text for text, _ in batch]
+        try:
+            probs = await loop.run_in_executor(get_executor(), ml_model.predict_proba, texts)
+            for (_, future), row in zip(batch, probs):
+                if not future.done(): future.set_result(row)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done(): future.set_exception(e)
+
+def _ensure_batch_worker():
+    global _batch_task, _pending_event
+    loop = asyncio.get_running_loop()
+    if _batch_task is None or _batch_task.done() or _batch_task.get_loop() is not loop:
+        # (Re)start on this loop; requests queued from an earlier, closed loop can never be answered
+        _pending[:] = [(text, future) for text, future in _pending if future.get_loop() is loop]
+        _pending_event = asyncio.Event()
+        if _pending: _pending_event.set()
+        _batch_task = loop.create_task(batch_worker())
+
+@app.on_event("startup")
+async def start_batch_worker():
+    get_executor()
+    _ensure_batch_worker()
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    global EXECUTOR
+    if EXECUTOR is not None:
+        EXECUTOR.shutdown(wait=False)
+        EXECUTOR = None
+
+async def enqueue(text: str):
+    """Queue one text for the next batch; resolves to its row of class probabilities."""
+    _ensure_batch_worker()
+    future = asyncio.get_running_loop().create_future()
+    _pending.append((text, future))
+    _pending_event.set()
+    return await future
+
 # --- Helper Functions ---
-def find_rule_based_predictions(text: str) -> List[Dict]:
+def _preprocess(text: str) -> Tuple[str, Set[str]]:
+    """Clean the input once: (text for ml_model, token set for rule matching)."""
+    try:
+        if _CLEANER:
+            cleaned_text = _CLEANER.transform(text)
+            model_text = cleaned_text if ml_model is not model_pipeline else text
+            return model_text, set(cleaned_text.split())
+    except Exception: pass
+    return text, set(_WORD_RE.findall(text.lower()))
+
+def find_rule_based_predictions(symptoms_in_text: Set[str]) -> List[Dict]:
     if not raw_kb_rules: return []
-    text_lower = text.lower()
     predictions = []
-    symptoms_in_text = set()
-    try:
-        if TextCleaner:
-            cleaned_text = TextCleaner().transform(text_lower)
-            symptoms_in_text = set(cleaned_text.split())
-        else: symptoms_in_text = set(re.findall(r'\b\w+\b', text_lower))
-    except Exception: symptoms_in_text = set(re.findall(r'\b\w+\b', text_lower))
-    
-    # (Rest of the function is correct)
-    for rule in raw_kb_rules:
-        rule_symptoms = set(s.lower() for s in rule.get("symptoms", []))
-        if not rule_symptoms: continue
-        matched_symptoms = rule_symptoms.intersection(symptoms_in_text)
-        if matched_symptoms:
-            match_ratio = len(matched_symptoms) / len(rule_symptoms)
-            if match_ratio >= 0.4:
-                for cond in rule.get("conditions", []):
-                    disease_name = cond.get("name")
-                    if disease_name:
-                        score = cond.get("score", 0.5) * match_ratio
-                        predictions.append({"disease": disease_name, "probability": score})
+
+    # ✅ Only rules sharing at least one token with the input can match (inverted index)
+    candidates = sorted(set().union(*(token_to_rules.get(t, ()) for t in symptoms_in_text)))
+    if not candidates: return []
+    # Match counts for the candidate rules in one sparse mat-vec: rule_matrix rows @ (0/1 vector of input tokens)
+    cols = [rule_vocab[t] for t in symptoms_in_text if t in rule_vocab]
+    v = sparse.csr_matrix((np.ones(len(cols)), ([0] * len(cols), cols)), shape=(1, len(rule_vocab)))
+    matches = (rule_matrix[candidates] @ v.T).toarray().ravel()
+    ratios = matches / rule_len[candidates]
+    for j in np.flatnonzero(ratios >= 0.4):
+        i = candidates[j]
+        match_ratio = float(ratios[j])
+        for disease_name, cond_score in raw_kb_rules[i]["_conditions"]:
+            score = cond_score * match_ratio
+            predictions.append({"disease": disease_name, "probability": score})
     aggregated_preds = {}
     for p in predictions:
         d = p["disease"]
         aggregated_preds[d] = max(aggregated_preds.get(d, 0.0), p["probability"])
     return [{"disease": d, "probability": p} for d, p in aggregated_preds.items()]
 
-def apply_kb_rules( disease: str, base_prob: float, answers: Dict[str, str]) -> Tuple[float, List[Dict]]:
+def apply_kb_rules( disease: str, base_prob: float, answers: Dict[str, str],
+                    questions_out: Optional[Dict[str, Dict]] = None) -> Tuple[float, List[Dict]]:
+    """
+    Boosted probability plus this disease's follow-up questions.
+    With questions_out, questions are added straight into that qid -> question dict
+    (first one wins, shared across diseases) and the returned list is empty.
+    """
     disease_key = disease.lower()
     prob = base_prob
     questions_to_return = []
     boost = 0.0
-    NEGATIVE_BOOST_MULTIPLIER = -0.25
     rules_for_disease = knowledge_base.get(disease_key, [])
     if not rules_for_disease: return prob, []
     processed_qids = set()
+    collect_locally = questions_out is None
     
     # (Rest of the function is correct)
     for rule in rules_for_disease:
-        for follow_up in rule.get("follow_ups", []):
+        for follow_up, boost_values in zip(rule.get("follow_ups", []), rule["_boost_values"]):
             qid = follow_up.get("id")
             if not qid: continue
-            if qid not in processed_qids:
+            if not collect_locally:
+                questions_out.setdefault(qid, follow_up)
+            elif qid not in processed_qids:
                 questions_to_return.append(follow_up)
                 processed_qids.add(qid)
             ans = answers.get(qid, "").lower()
             if not ans: continue
-            for boost_item in follow_up.get("boosts", []):
-                if boost_item.get("name", "").lower() == disease_key:
-                    try:
-                        boost_value = float(boost_item.get("value", 0.0))
-                        multiplier = 0.5
-                        if ans in ["yes", "y"]: multiplier = 1.0
-                        elif ans in ["no", "n"]: multiplier = NEGATIVE_BOOST_MULTIPLIER
-                        boost += boost_value * multiplier
-                        break
-                    except (ValueError, TypeError):
-                        print(f"Warning: Invalid boost value for qid {qid}: {boost_item}")
+            # ✅ Boost values were parsed at KB load; the answer maps straight to its multiplier
+            boost_value = boost_values.get(disease_key)
+            if boost_value is not None:
+                boost += boost_value * ANSWER_MULTIPLIERS.get(ans, UNSURE_BOOST_MULTIPLIER)
     final_prob = min(max(prob + boost, 0.0), 1.0)
     return final_prob, questions_to_return
 
@@ -176,27 +350,69 @@ def root():
     return {"message": "Hybrid Disease Prediction API (v3.4) is running."}
 
 @app.post("/predict")
-def predict_v1(req: SymptomRequest):
+async def predict_v1(req: SymptomRequest):
     print("Received request on legacy /predict endpoint.")
-    return predict_logic(req, version="v1")
+    return await predict_logic(req, version="v1")
 
 @app.post("/predict_v2")
-def predict_v2(req: SymptomRequest):
+async def predict_v2(req: SymptomRequest):
     print(f"Received request on /predict_v2: text='{req.text}', answers={req.follow_up_answers}")
-    return predict_logic(req, version="v2")
+    return await predict_logic(req, version="v2")
+
+def _predict_batch_sync(req: BatchRequest) -> List[Dict]:
+    """Preprocess, predict and build every response for a batch (CPU-bound; runs on the executor)."""
+    prepared = [_preprocess(text) for text in req.texts]
+    # ✅ One predict_proba call for the whole batch
+    all_probs = ml_model.predict_proba([model_text for model_text, _ in prepared])
+    results = []
+    for text, (_, tokens), model_probs in zip(req.texts, prepared, all_probs):
+        single = SymptomRequest(text=text, top_k=req.top_k, follow_up_answers=req.follow_up_answers)
+        results.append(build_prediction_response(single, model_probs, tokens))
+    return results
+
+@app.post("/predict_batch")
+async def predict_batch(req: BatchRequest):
+    print(f"Received request on /predict_batch: {len(req.texts)} texts")
+    if len(req.texts) > MAX_BATCH_TEXTS:
+        raise HTTPException(status_code=413, detail=f"Too many texts: {len(req.texts)} (max {MAX_BATCH_TEXTS} per request).")
+    if not model_pipeline or not label_encoder:
+        print("❌ Prediction failed: Model or encoder not available.")
+        raise HTTPException(status_code=503, detail="Model not loaded. Check server logs.")
+    if not req.texts:
+        return {"results": []}
+    try:
+        # The whole batch runs off the event loop, so other requests keep being served meanwhile
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(get_executor(), _predict_batch_sync, req)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error during batch prediction: {type(e).__name__} - {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+    return {"results": results}
 
 # Main prediction logic
-def predict_logic(req: SymptomRequest, version="v2"):
+async def predict_logic(req: SymptomRequest, version="v2"):
     if not model_pipeline or not label_encoder:
         print("❌ Prediction failed: Model or encoder not available.")
         raise HTTPException(status_code=503, detail="Model not loaded. Check server logs.")
     try:
-        text_input = [req.text]
-        model_probs = model_pipeline.predict_proba(text_input)[0]
-        ml_predictions = { label_encoder.classes_[i]: prob for i, prob in enumerate(model_probs) }
-        print(f"ℹ️ ML Predictions (raw): {dict(list(sorted(ml_predictions.items(), key=lambda item: item[1], reverse=True))[:5])}")
+        model_text, tokens = _preprocess(req.text)
+        model_probs = await enqueue(model_text)
+    except Exception as e:
+        print(f"❌ Error during prediction logic: {type(e).__name__} - {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+    return build_prediction_response(req, model_probs, tokens)
+
+def build_prediction_response(req: SymptomRequest, model_probs, symptoms_in_text: Set[str]) -> Dict:
+    """Combine one row of ML probabilities with the rule engine and KB boosts."""
+    try:
+        ml_predictions = dict(zip(CLASSES, model_probs))
+        print(f"ℹ️ ML Predictions (raw): {dict(heapq.nlargest(5, ml_predictions.items(), key=itemgetter(1)))}")
         
-        rule_preds_list = find_rule_based_predictions(req.text)
+        rule_preds_list = find_rule_based_predictions(symptoms_in_text)
         rule_preds = {p["disease"]: p["probability"] for p in rule_preds_list}
         print(f"ℹ️ Rule Predictions: {rule_preds}")
         
@@ -206,27 +422,25 @@ def predict_logic(req: SymptomRequest, version="v2"):
             ml_prob = combined_scores.get(disease, 0.0)
             combined_scores[disease] = min((ml_prob * 0.7) + (rule_prob * 0.3), 1.0)
         
-        sorted_diseases = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)
-        top_results_unboosted = [(d, p) for d, p in sorted_diseases if p > 0.0][: req.top_k]
+        # ✅ Top-k selection is O(n log k); nlargest keeps sorted()'s order for ties
+        top_results_unboosted = heapq.nlargest(
+            req.top_k, ((d, p) for d, p in combined_scores.items() if p > 0.0), key=itemgetter(1))
         print(f"ℹ️ Top {req.top_k} Combined (Pre-Boost): {top_results_unboosted}")
         
         final_predictions = []
         all_follow_up_questions = {}
         for disease, probability in top_results_unboosted:
-            boosted_prob, questions_for_disease = apply_kb_rules(disease, probability, req.follow_up_answers)
+            # ✅ Questions go straight into one shared, insertion-ordered dict (no per-disease lists to merge)
+            boosted_prob, _ = apply_kb_rules(disease, probability, req.follow_up_answers,
+                                             questions_out=all_follow_up_questions)
             final_predictions.append({ "disease": disease, "probability": round(boosted_prob, 4)})
-            for q in questions_for_disease:
-                q_id = q.get("id")
-                if q_id and q_id not in all_follow_up_questions:
-                    all_follow_up_questions[q_id] = q
         
         final_predictions = sorted(final_predictions, key=lambda x: x["probability"], reverse=True)
         print(f"ℹ️ Final Top {req.top_k} (Post-Boost): {final_predictions}")
         
-        if final_predictions:
-            final_predictions[0]["follow_up_questions"] = list(all_follow_up_questions.values())
-            for i in range(1, len(final_predictions)):
-                final_predictions[i]["follow_up_questions"] = []
+        # The merged question list is attached to the top prediction only
+        for rank, prediction in enumerate(final_predictions):
+            prediction["follow_up_questions"] = list(all_follow_up_questions.values()) if rank == 0 else []
         
         return {
             "predictions": final_predictions,
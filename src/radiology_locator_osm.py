@@ -1,7 +1,11 @@
 # src/radiology_locator_osm.py
 
-import requests
-from geopy.distance import geodesic
+import sys
+from pathlib import Path
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from src.utils.overpass import OVERPASS_URL, REQUEST_ERRORS, cache_key, haversine_km, post_query
 
 class RadiologyLocatorOSM:
     """
@@ -10,7 +14,7 @@ class RadiologyLocatorOSM:
     ✅ MODIFIED to align with app_streamlit.py expectations.
     """
 
-    OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+    OVERPASS_URL = OVERPASS_URL
 
     # ✅ --- MODIFIED ---
     # Removed __init__ as radius is now passed directly to the method.
@@ -27,6 +31,21 @@ class RadiologyLocatorOSM:
         :param radius: Search radius in meters (passed from UI)
         :return: Dict with "results" list or "error" message
         """
+        query = self._build_query(latitude, longitude, radius)
+
+        try:
+            # Cached for a while per ~100 m area, so repeated searches skip the API
+            data = post_query(query, self.OVERPASS_URL, key=cache_key("radiology", latitude, longitude, radius))
+        except REQUEST_ERRORS as e:
+            print(f"Error fetching data from Overpass API: {e}")
+            # ✅ --- MODIFIED ---
+            # Return dict matching Streamlit app's error check
+            return {"error": f"API request failed: {e}", "results": []}
+
+        return self._parse_results(data, latitude, longitude)
+
+    def _build_query(self, latitude: float, longitude: float, radius: int) -> str:
+        """Overpass QL query for this locator."""
         
         # ✅ --- MODIFIED ---
         # Use the 'radius' variable from arguments, not 'self.radius'
@@ -40,46 +59,34 @@ class RadiologyLocatorOSM:
         );
         out center;
         """
+        return query
 
-        try:
-            response = requests.get(self.OVERPASS_URL, params={'data': query}, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-        except requests.RequestException as e:
-            print(f"Error fetching data from Overpass API: {e}")
-            # ✅ --- MODIFIED ---
-            # Return dict matching Streamlit app's error check
-            return {"error": f"API request failed: {e}", "results": []}
-
-        user_coords = (latitude, longitude)
-        places = []
-
-        for element in data.get("elements", []):
-            tags = element.get("tags", {})
-            name = tags.get("name", "Unknown location")
-            
-            # Use fallback for address
-            addr = tags.get("addr:full", tags.get("addr:street", "No address provided"))
-            
-            phone = tags.get("phone", "No phone number provided")
-            website = tags.get("website", "No website provided")
-            lat, lon = element["lat"], element["lon"]
-
-            distance_km = round(geodesic(user_coords, (lat, lon)).kilometers, 2)
+    def _parse_results(self, data: dict, latitude: float, longitude: float):
+        """Turn an Overpass JSON response into the result dict, sorted by distance."""
+        elements = data.get("elements", [])
+        if not elements:
+            return {"results": []}
 
-            places.append({
-                "name": name,
-                "address": addr,
-                "latitude": lat,
-                "longitude": lon,
-                "distance_km": distance_km,
-                "phone": phone,
-                "website": website
-            })
+        # ✅ Coordinates and tags pulled out once; all distances in one vectorized haversine pass
+        lats = [e["lat"] for e in elements]
+        lons = [e["lon"] for e in elements]
+        tags_list = [e.get("tags", {}) for e in elements]
+        distances = np.round(haversine_km(latitude, longitude, lats, lons), 2).tolist()
 
-        # Sort results by distance
-        if places:
-            places.sort(key=lambda p: p["distance_km"])
+        # Single pass, nearest first (stable, so ties keep API order); address falls back to the street
+        places = [
+            {
+                "name": tags.get("name", "Unknown location"),
+                "address": tags.get("addr:full", tags.get("addr:street", "No address provided")),
+                "latitude": lats[i],
+                "longitude": lons[i],
+                "distance_km": distances[i],
+                "phone": tags.get("phone", "No phone number provided"),
+                "website": tags.get("website", "No website provided"),
+            }
+            for i in sorted(range(len(elements)), key=distances.__getitem__)
+            for tags in (tags_list[i],)
+        ]
 
         # ✅ --- MODIFIED ---
         # Return dict matching Streamlit app's success check
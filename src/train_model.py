@@ -9,28 +9,46 @@ Key safety fixes:
 """
 
 import os
+import sys
+import math
 import json
+import hashlib
+import inspect
 import argparse
 import joblib
+import numpy as np
 import pandas as pd
 import tempfile
+from scipy import sparse
+import sklearn
 from datetime import datetime
-from sklearn.model_selection import GridSearchCV, train_test_split
+from sklearn.base import clone
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables HalvingGridSearchCV)
+from sklearn.model_selection import GridSearchCV, HalvingGridSearchCV, ParameterGrid, train_test_split
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
 from sklearn.preprocessing import LabelEncoder
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import classification_report, accuracy_score, f1_score
 import warnings
 warnings.filterwarnings("ignore")
 
+# Optional (--lightgbm): LightGBM in random-forest mode trains much faster than sklearn's RF on sparse TF-IDF input
+try:
+    import lightgbm
+except ImportError:
+    lightgbm = None
+
 # --- Paths ---
 DATA_PATH = os.path.join("data", "merged_comprehensive_data.csv")
 MODELS_DIR = "models"
 MODEL_PATH = os.path.join(MODELS_DIR, "optimized_nlp_pipeline.joblib")
 ENCODER_PATH = os.path.join(MODELS_DIR, "nlp_label_encoder.joblib")
 REPORT_PATH = os.path.join(MODELS_DIR, "training_report.json")
-TRAIN_SNAPSHOT_PATH = os.path.join(MODELS_DIR, "training_snapshot.csv")
+TRAIN_SNAPSHOT_PATH = os.path.join(MODELS_DIR, "training_snapshot.parquet")
+ONNX_PATH = os.path.join(MODELS_DIR, "optimized_nlp_pipeline.onnx")
+FEATURE_CACHE_DIR = os.path.join(MODELS_DIR, ".feature_cache") # Fitted cleaner+vectorizer and TF-IDF matrices, see cached_featurize()
+FEATURE_CACHE_VERSION = 1 # Bump to invalidate every cached feature matrix (e.g. after a cache format change)
 
 # --- Import TextCleaner (project-specific), with fallback ---
 try:
@@ -46,23 +64,34 @@ except Exception as e:
     print(f"⚠️ Could not import src.utils.text_cleaner: {e}")
     # Minimal fallback that attempts to mimic expected cleaning (keeps English & Arabic letters + spaces)
     from sklearn.base import BaseEstimator, TransformerMixin
-    import re
+
+    class _SpaceOutTable(dict):
+        """str.translate table: keeps ASCII letters/digits, Arabic letters, whitespace and ','; anything else -> space."""
+        def __missing__(self, codepoint):
+            char = chr(codepoint)
+            keep = (char.isascii() and char.isalnum()) or 0x0621 <= codepoint <= 0x064A or char.isspace() or char == ","
+            self[codepoint] = codepoint if keep else ord(" ")
+            return self[codepoint]
+
     class TextCleaner(BaseEstimator, TransformerMixin):
+        _TABLE = _SpaceOutTable()
+
         def fit(self, X, y=None): return self
+
+        def _clean_series(self, s):
+            # ✅ Vectorized .str chain: one translate pass, then split/join collapses whitespace (no regex)
+            return s.astype(str).str.translate(self._TABLE).str.split().str.join(" ").str.lower()
+
         def transform(self, X, y=None):
-            pattern = re.compile(r"[^a-zA-Z0-9\u0621-\u064A\s,]")
             def clean_one(text):
                 try:
-                    s = str(text)
-                    s = pattern.sub(" ", s)
-                    s = re.sub(r"\s+", " ", s).strip().lower()
-                    return s
+                    return " ".join(str(text).translate(self._TABLE).split()).lower()
                 except Exception:
                     return ""
             if isinstance(X, pd.Series):
-                return X.apply(clean_one)
+                return self._clean_series(X)
             if isinstance(X, list):
-                return pd.Series(X).apply(clean_one).tolist()
+                return self._clean_series(pd.Series(X, dtype=object)).tolist()
             # fallback convert
             if isinstance(X, str):
                 return clean_one(X)
@@ -90,11 +119,211 @@ def safe_joblib_dump(obj, final_path):
     dirn = os.path.dirname(final_path) or "."
     fd, tmp_path = tempfile.mkstemp(dir=dirn, suffix=".tmp")
     os.close(fd)
-    joblib.dump(obj, tmp_path)
+    joblib.dump(obj, tmp_path, compress=0) # Uncompressed, so loaders can memory-map the arrays (mmap_mode='r')
     os.replace(tmp_path, final_path)
 
 
-def train_model(fast_mode=False, random_state=42):
+def save_snapshot(df, final_path):
+    """
+    Save the training data as zstd-compressed Parquet (much smaller and faster to write than CSV).
+    Falls back to a CSV with the same base name if no Parquet engine (pyarrow) is installed.
+    Returns the path written.
+    """
+    try:
+        df.to_parquet(final_path, engine="pyarrow", compression="zstd", index=False)
+        return final_path
+    except ImportError:
+        csv_path = os.path.splitext(final_path)[0] + ".csv"
+        df.to_csv(csv_path, index=False)
+        return csv_path
+
+
+def export_onnx(pipeline, final_path):
+    """
+    Export the fitted pipeline (without the TextCleaner step) to ONNX for onnxruntime inference.
+    DiagnosisAgent cleans text itself, so the exported graph takes already-cleaned text.
+    Requires the optional 'skl2onnx' package. Returns True on success.
+    """
+    if any(isinstance(est, HashingVectorizer) for _, est in pipeline.steps):
+        print("⚠️ skl2onnx has no HashingVectorizer converter. Skipping ONNX export (train without --hashing).")
+        return False
+    if lightgbm is not None and isinstance(pipeline.steps[-1][1], lightgbm.LGBMClassifier):
+        print("⚠️ skl2onnx cannot convert LightGBM models. Skipping ONNX export (train without --lightgbm).")
+        return False
+    try:
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import StringTensorType
+    except ImportError:
+        print("⚠️ skl2onnx is not installed. Skipping ONNX export (pip install skl2onnx onnxruntime).")
+        return False
+
+    steps = [(name, est) for name, est in pipeline.steps if not isinstance(est, TextCleaner)]
+    onnx_pipeline = Pipeline(steps)
+    options = {id(steps[-1][1]): {"zipmap": False}}  # plain probability matrix instead of list of dicts
+    for _, est in steps:
+        if isinstance(est, TfidfVectorizer):
+            options[id(est)] = {"locale": "C"}  # avoid depending on installed system locales
+
+    try:
+        onx = convert_sklearn(
+            onnx_pipeline,
+            initial_types=[("input", StringTensorType([None, 1]))],
+            options=options,
+        )
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        dirn = os.path.dirname(final_path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=dirn, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(onx.SerializeToString())
+        os.replace(tmp_path, final_path)
+        return True
+    except Exception as e:
+        print(f"❌ Error exporting ONNX model: {e}")
+        return False
+
+
+def _featurizer_code_tag(featurizer) -> str:
+    """
+    Version tag for the featurizer code: cache format version, sklearn version and a hash of the source
+    of every non-sklearn step's module (e.g. TextCleaner), so code changes never reuse stale features.
+    """
+    parts = [f"v{FEATURE_CACHE_VERSION}", f"sklearn={sklearn.__version__}"]
+    for name, est in featurizer.steps:
+        module_name = type(est).__module__
+        if module_name.split(".")[0] == "sklearn":
+            continue
+        try:
+            source = inspect.getsource(sys.modules[module_name])
+        except Exception:
+            source = type(est).__qualname__ # Source unavailable (e.g. frozen build): fall back to the class name
+        parts.append(f"{name}={hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]}")
+    return ";".join(parts)
+
+
+def cached_featurize(featurizer, X_train):
+    """
+    Fit the cleaner + vectorizer pipeline on X_train and return (fitted featurizer, sparse matrix).
+    Results are cached in FEATURE_CACHE_DIR, keyed on a SHA-256 of the training text, the featurizer
+    params and _featurizer_code_tag(), so re-training on unchanged data skips tokenization. Any change to
+    the dataset, split, params, cleaner code or sklearn version gives a new key (old entries are never
+    reused; delete the folder to reclaim space).
+    """
+    params = {name: est.get_params() for name, est in featurizer.steps}
+    digest = hashlib.sha256(X_train.str.cat(sep="\n").encode("utf-8"))
+    digest.update(json.dumps(params, sort_keys=True, default=repr).encode("utf-8"))
+    digest.update(_featurizer_code_tag(featurizer).encode("utf-8"))
+    key = digest.hexdigest()[:20]
+    featurizer_path = os.path.join(FEATURE_CACHE_DIR, f"{key}.joblib")
+    matrix_path = os.path.join(FEATURE_CACHE_DIR, f"{key}.npz")
+
+    if os.path.exists(featurizer_path) and os.path.exists(matrix_path):
+        try:
+            X_vec = sparse.load_npz(matrix_path)
+            cached = joblib.load(featurizer_path)
+            print(f"♻️ Reusing cached features ({key}).")
+            return cached, X_vec
+        except Exception as e:
+            print(f"⚠️ Could not load cached features ({e}). Re-fitting.")
+
+    X_vec = featurizer.fit_transform(X_train)
+    try:
+        safe_joblib_dump(featurizer, featurizer_path)
+        sparse.save_npz(matrix_path, sparse.csr_matrix(X_vec), compressed=False)
+    except Exception as e:
+        print(f"⚠️ Could not cache features: {e}")
+    return featurizer, X_vec
+
+
+def build_vectorizer(use_hashing=False):
+    """
+    Text-to-features steps plus their GridSearch grid.
+    With use_hashing, a stateless HashingVectorizer (fixed 2**18 columns, no vocabulary dict to build
+    per fit) feeds a TfidfTransformer, and the grid tunes the hasher's ngram_range instead of max_features.
+    Features are float32: half the bytes of float64, and what the tree classifiers convert their input to anyway.
+    """
+    if use_hashing:
+        steps = [
+            ("hasher", HashingVectorizer(stop_words="english", ngram_range=(1, 2), alternate_sign=False, norm=None, dtype=np.float32)),
+            ("tfidf", TfidfTransformer()),
+        ]
+        param_grid = {"hasher__ngram_range": [(1, 1), (1, 2)]}
+        return steps, param_grid
+
+    steps = [("tfidf", TfidfVectorizer(stop_words="english", ngram_range=(1, 2), max_features=5000, dtype=np.float32))]
+    param_grid = {
+        "tfidf__max_features": [3000, 5000],
+        "tfidf__ngram_range": [(1, 1), (1, 2)],
+    }
+    return steps, param_grid
+
+
+def build_classifier(random_state=42, use_lightgbm=False):
+    """
+    Classifier step plus its GridSearch grid (keys prefixed 'rf__') and fast-mode params.
+    sklearn's RandomForestClassifier by default; with use_lightgbm (opt-in, experimental: no ONNX export)
+    LightGBM with boosting_type='rf', if it is installed.
+    Both start with n_jobs=1 (GridSearchCV already parallelizes across fits); train_model raises it for the final fit.
+    """
+    if use_lightgbm and lightgbm is None:
+        print("⚠️ LightGBM is not installed (pip install lightgbm). Using RandomForestClassifier.")
+    if use_lightgbm and lightgbm is not None:
+        clf = lightgbm.LGBMClassifier(
+            # rf mode requires bagging: subsample/subsample_freq = bagging_fraction/bagging_freq
+            boosting_type="rf", subsample=0.8, subsample_freq=1, colsample_bytree=0.8,
+            class_weight="balanced", n_jobs=1, verbosity=-1, random_state=random_state,
+        )
+        param_grid = {
+            "rf__num_leaves": [31, 63],
+            "rf__n_estimators": [150, 300],
+            "rf__min_child_samples": [10, 20], # a.k.a. min_data_in_leaf
+        }
+        fast_params = {"rf__n_estimators": 150}
+        return clf, param_grid, fast_params
+
+    clf = RandomForestClassifier(random_state=random_state, class_weight="balanced_subsample", n_jobs=1)
+    param_grid = {
+        "rf__n_estimators": [150, 300],
+        "rf__max_depth": [20, 30, None],
+        "rf__min_samples_split": [2, 5]
+    }
+    fast_params = {"rf__n_estimators": 150, "rf__max_depth": 25}
+    return clf, param_grid, fast_params
+
+
+def build_search(estimator, param_grid, cv, random_state=42, use_halving=False):
+    """
+    Hyperparameter search over param_grid, scored by weighted F1 (robust to class imbalance).
+    With use_halving, HalvingGridSearchCV starts every candidate on a subset of rows and only the best
+    third of each round moves on to more data, so weak settings never get a full-size fit. On small
+    datasets the early rounds are noisy and it can settle on a slightly weaker model, hence opt-in.
+    refit=False: train_model does the final fit itself.
+    """
+    if use_halving:
+        return HalvingGridSearchCV(
+            estimator=estimator,
+            param_grid=param_grid,
+            scoring="f1_weighted",
+            cv=cv,
+            factor=3,
+            resource="n_samples",
+            min_resources="exhaust",
+            random_state=random_state,
+            refit=False,
+            n_jobs=-1,
+            verbose=1
+        )
+    return GridSearchCV(
+        estimator=estimator,
+        param_grid=param_grid,
+        scoring="f1_weighted",
+        cv=cv,
+        refit=False,
+        n_jobs=-1,
+        verbose=1
+    )
+
+
+def train_model(fast_mode=False, random_state=42, onnx_export=False, use_lightgbm=False, use_hashing=False, use_halving=False):
     """Main training routine. Splits data first, then (optionally) GridSearch on training set."""
     print("🚀 Loading data...")
     df = load_data()
@@ -106,8 +335,8 @@ def train_model(fast_mode=False, random_state=42):
     # Save a training snapshot for reproducibility/inspection
     try:
         os.makedirs(MODELS_DIR, exist_ok=True)
-        df.to_csv(TRAIN_SNAPSHOT_PATH, index=False)
-        print(f"💾 Training snapshot saved to: {TRAIN_SNAPSHOT_PATH}")
+        snapshot_path = save_snapshot(df, TRAIN_SNAPSHOT_PATH)
+        print(f"💾 Training snapshot saved to: {snapshot_path}")
     except Exception as e:
         print(f"⚠️ Could not save training snapshot: {e}")
 
@@ -116,61 +345,72 @@ def train_model(fast_mode=False, random_state=42):
     y_encoded = le.fit_transform(y)
 
     # Split first to avoid data leakage!
-    try:
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y_encoded, test_size=0.20, random_state=random_state, stratify=y_encoded
-        )
-    except ValueError:
-        # Fallback for small datasets where stratify fails
-        print("⚠️ Stratify failed (likely small dataset). Splitting without stratify.")
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y_encoded, test_size=0.20, random_state=random_state
-        )
-        
+    # Stratify only when it can work: every class needs 2+ rows, and both splits need room for every class
+    test_size = 0.20
+    n_classes = len(le.classes_)
+    n_test = math.ceil(test_size * len(y_encoded))
+    can_stratify = np.bincount(y_encoded).min() >= 2 and min(n_test, len(y_encoded) - n_test) >= n_classes
+    if not can_stratify:
+        print("⚠️ Too few samples per class to stratify (likely small dataset). Splitting without stratify.")
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y_encoded, test_size=test_size, random_state=random_state, stratify=y_encoded if can_stratify else None
+    )
+
     print(f"✅ Split into Train={len(X_train)} and Test={len(X_test)}")
 
-    # Build pipeline including the TextCleaner
-    pipeline = Pipeline([
-        ("cleaner", TextCleaner()),
-        ("tfidf", TfidfVectorizer(stop_words="english", ngram_range=(1, 2), max_features=5000)),
-        ("rf", RandomForestClassifier(random_state=random_state, class_weight="balanced_subsample"))
-    ])
+    # Build the featurizer (TextCleaner + vectorizer) and classifier; they form the saved pipeline
+    vec_steps, vec_param_grid = build_vectorizer(use_hashing)
+    clf, clf_param_grid, clf_fast_params = build_classifier(random_state, use_lightgbm)
+    print(f"ℹ️ Vectorizer: {' + '.join(type(est).__name__ for _, est in vec_steps)}, Classifier: {type(clf).__name__}")
+    featurizer = Pipeline([("cleaner", TextCleaner()), *vec_steps])
 
     best_params = None
     cv_used = None
 
     if fast_mode:
         print("⚡ Running FAST mode: direct fit on training set (no GridSearch).")
-        pipeline.set_params(rf__n_estimators=150, rf__max_depth=25)
-        pipeline.fit(X_train, y_train)
+        featurizer, X_train_vec = cached_featurize(featurizer, X_train)
+        clf.set_params(**{key.split("__", 1)[1]: value for key, value in clf_fast_params.items()})
     else:
         # Choose cv safely based on smallest class count in training set
         min_class_count = pd.Series(y_train).value_counts().min()
         cv = max(2, min(3, int(min_class_count)))  # between 2 and 3 folds, but not more than class count
         cv_used = cv
-        print(f"🔍 Running GridSearchCV on training set only (cv={cv}) — this may take time...")
+        print(f"🔍 Running {'HalvingGridSearchCV' if use_halving else 'GridSearchCV'} on training set only (cv={cv}) — this may take time...")
 
-        param_grid = {
-            "tfidf__max_features": [3000, 5000],
-            "tfidf__ngram_range": [(1, 1), (1, 2)],
-            "rf__n_estimators": [150, 300],
-            "rf__max_depth": [20, 30, None],
-            "rf__min_samples_split": [2, 5]
-        }
+        # ✅ Vectorize once per vectorizer setting, then grid-search only the classifier on that matrix,
+        # instead of re-running cleaner + vectorizer for every (classifier params, fold) cell.
+        # The vectorizer sees the whole training set (not just the CV train folds); the test set stays held out.
+        clf_grid = {key.split("__", 1)[1]: values for key, values in clf_param_grid.items()}
+        best_score = float("-inf")
+        best_vec_params, best_clf_params = {}, {}
+        for vec_params in ParameterGrid(vec_param_grid):
+            featurizer.set_params(**vec_params)
+            featurizer, X_train_vec = cached_featurize(featurizer, X_train)
+            grid = build_search(clone(clf), clf_grid, cv, random_state, use_halving)
+            # ✅ Threads share the sparse matrix in place (no per-worker pickling as with loky processes);
+            # tree building releases the GIL, so the fits still run in parallel
+            with joblib.parallel_backend("threading", n_jobs=-1):
+                grid.fit(X_train_vec, y_train)
+            print(f"   {vec_params} -> best CV f1_weighted={grid.best_score_:.4f}")
+            if grid.best_score_ > best_score:
+                best_score = grid.best_score_
+                best_vec_params, best_clf_params = vec_params, grid.best_params_
 
-        grid = GridSearchCV(
-            estimator=pipeline,
-            param_grid=param_grid,
-            scoring="f1_weighted",  # robust to class imbalance
-            cv=cv,
-            n_jobs=-1,
-            verbose=2
-        )
-        grid.fit(X_train, y_train)
-        pipeline = grid.best_estimator_
-        best_params = grid.best_params_
+        # Final fit with the chosen params (the features come straight from the cache)
+        featurizer.set_params(**best_vec_params)
+        featurizer, X_train_vec = cached_featurize(featurizer, X_train)
+        clf.set_params(**best_clf_params)
+        best_params = {**best_vec_params, **{f"rf__{key}": value for key, value in best_clf_params.items()}}
         print(f"✅ GridSearch finished. Best params: {best_params}")
 
+    # ✅ Search fits stay single-threaded (GridSearchCV already runs them in parallel); the one final
+    # fit uses every core. Reset afterwards so the saved model doesn't spawn threads per prediction.
+    clf.set_params(n_jobs=-1)
+    clf.fit(X_train_vec, y_train)
+    clf.set_params(n_jobs=1)
+    pipeline = Pipeline([*featurizer.steps, ("rf", clf)])
+
     # Final evaluation on the held-out test set
     print("🔎 Evaluating on held-out test set...")
     y_pred = pipeline.predict(X_test)
@@ -193,10 +433,19 @@ def train_model(fast_mode=False, random_state=42):
     except Exception as e:
         print(f"❌ Error saving model or encoder: {e}")
 
+    onnx_saved = False
+    if onnx_export:
+        onnx_saved = export_onnx(pipeline, ONNX_PATH)
+        if onnx_saved:
+            print(f"✅ ONNX model saved to: {ONNX_PATH}")
+
     # Save training report with metadata
     report = {
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "fast_mode": bool(fast_mode),
+        "search": None if fast_mode else ("halving" if use_halving else "grid"),
+        "vectorizer": "hashing" if use_hashing else "tfidf",
+        "classifier": type(pipeline.steps[-1][1]).__name__,
         "n_records_total": int(len(df)),
         "n_train": int(len(X_train)),
         "n_test": int(len(X_test)),
@@ -205,7 +454,8 @@ def train_model(fast_mode=False, random_state=42):
         "best_params": best_params,
         "cv_used_on_training": cv_used,
         "model_path": MODEL_PATH,
-        "encoder_path": ENCODER_PATH
+        "encoder_path": ENCODER_PATH,
+        "onnx_path": ONNX_PATH if onnx_saved else None
     }
     try:
         with open(REPORT_PATH, "w", encoding="utf-8") as fh:
@@ -220,8 +470,12 @@ def train_model(fast_mode=False, random_state=42):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Train NLP disease prediction model (safe: no data leakage).")
     parser.add_argument("--fast", action="store_true", help="Run quick training without GridSearch (fast mode).")
+    parser.add_argument("--onnx", action="store_true", help="Also export the model to ONNX (requires skl2onnx).")
+    parser.add_argument("--lightgbm", action="store_true", help="Train LightGBM in random-forest mode instead of sklearn's RandomForest (requires lightgbm; no ONNX export).")
+    parser.add_argument("--hashing", action="store_true", help="Use HashingVectorizer + TfidfTransformer (faster GridSearch, no ONNX export).")
+    parser.add_argument("--halving", action="store_true", help="Use successive-halving search (fewer full-size fits) instead of the exhaustive grid.")
     args = parser.parse_args()
 
     print("🚀 Starting training (default = full GridSearch)...")
-    train_model(fast_mode=args.fast)
+    train_model(fast_mode=args.fast, onnx_export=args.onnx, use_lightgbm=args.lightgbm, use_hashing=args.hashing, use_halving=args.halving)
     print("✅ Training complete.")
\ No newline at end of file
@@ -5,6 +5,16 @@ import os
 from pathlib import Path
 import re # Import re for question cleaning
 
+# ✅ Compiled once at import instead of per follow-up question
+_WS_RE = re.compile(r'\s+')
+_NW_RE = re.compile(r'\W+')
+_SYMPTOM_COL_RE = re.compile(r'^symptom_\d+$')
+
+def _id_parts(values):
+    """Map each value to its question-id fragment (non-word runs -> '_', trimmed, max 50 chars), vectorized."""
+    values = pd.Series(sorted(values), dtype=object)
+    return dict(zip(values, values.str.replace(_NW_RE, '_', regex=True).str.strip('_').str[:50]))
+
 def generate_knowledge_base_final_wide():
     """
     Final, consolidated knowledge base generator. Handles WIDE format DiseaseAndSymptoms.csv.
@@ -50,21 +60,19 @@ def generate_knowledge_base_final_wide():
 
 
     # --- 3. Standardize Symptom and Disease Values ---
-    def standardize_text(s):
-        try:
-            return str(s).strip().lower().replace('_', ' ')
-        except:
-            return ""
+    def standardize_series(s):
+        """Vectorized str(x).strip().lower().replace('_', ' ') for a whole column (NaN becomes 'nan')."""
+        return s.astype(str).str.strip().str.lower().str.replace('_', ' ', regex=False)
 
     try:
         if 'disease' in disease_symptoms_wide.columns:
-            disease_symptoms_wide["disease"] = disease_symptoms_wide["disease"].apply(standardize_text)
+            disease_symptoms_wide["disease"] = standardize_series(disease_symptoms_wide["disease"])
         else:
              print("❌ Critical Error: 'disease' column not found in DiseaseAndSymptoms.csv.")
              return
 
         if 'symptom' in severity_df.columns:
-            severity_df["symptom"] = severity_df["symptom"].apply(standardize_text)
+            severity_symptoms = standardize_series(severity_df["symptom"])
         else:
             print("❌ Critical Error: 'symptom' column not found in Symptom-severity.csv.")
             return
@@ -72,15 +80,16 @@ def generate_knowledge_base_final_wide():
         if "disease" in descriptions_df.columns and "symptom" not in descriptions_df.columns:
             descriptions_df.rename(columns={"disease": "symptom"}, inplace=True)
         if 'symptom' in descriptions_df.columns:
-            descriptions_df["symptom"] = descriptions_df["symptom"].apply(standardize_text)
+            description_symptoms = standardize_series(descriptions_df["symptom"])
         else:
              print("❌ Critical Error: 'symptom' column not found in symptom_Description.csv.")
              return
 
-        severity_df.dropna(subset=['symptom'], inplace=True)
-        descriptions_df.dropna(subset=['symptom'], inplace=True)
-        severity_df = severity_df[severity_df['symptom'] != '']
-        descriptions_df = descriptions_df[descriptions_df['symptom'] != '']
+        # ✅ Standardize + drop empty symptoms with one mask and one filtered copy per frame
+        severity_df = severity_df.loc[severity_symptoms != ''].assign(symptom=severity_symptoms)
+        descriptions_df = descriptions_df.loc[description_symptoms != ''].assign(symptom=description_symptoms)
+        if 'weight' in severity_df.columns:
+            severity_df['weight'] = pd.to_numeric(severity_df['weight'], downcast='integer') # 1-7 fits in int8
 
 
         print("✅ Symptom and disease values standardized (lowercase, spaces, trimmed).")
@@ -109,7 +118,7 @@ def generate_knowledge_base_final_wide():
     disease_dict = {}
     try:
         id_vars = ['disease']
-        symptom_cols = [col for col in disease_symptoms_wide.columns if re.match(r'^symptom_\d+$', col)]
+        symptom_cols = [col for col in disease_symptoms_wide.columns if _SYMPTOM_COL_RE.match(col)]
 
         if not symptom_cols:
              print("❌ Error: No 'symptom_NUMBER' columns found in DiseaseAndSymptoms.csv after cleaning headers.")
@@ -125,19 +134,18 @@ def generate_knowledge_base_final_wide():
             value_name="symptom"
         )
 
-        melted.dropna(subset=["symptom"], inplace=True)
-        melted["symptom"] = melted["symptom"].apply(standardize_text)
-        melted = melted[melted['symptom'] != '']
-
-        for _, row in melted.iterrows():
-            disease = row["disease"]
-            symptom = row["symptom"]
-            if not disease or not symptom: continue
-            if disease not in disease_dict:
-                disease_dict[disease] = set()
-            disease_dict[disease].add(symptom)
-
-        disease_dict = {d: sorted(list(s)) for d, s in disease_dict.items() if s}
+        # ✅ Standardize, drop missing/empty symptoms and empty diseases in a single masked pass
+        symptoms = standardize_series(melted["symptom"])
+        keep = melted["symptom"].notna() & (symptoms != '') & (melted["disease"] != '')
+        melted = melted.loc[keep].assign(symptom=symptoms)
+        # ✅ Few hundred distinct values: categoricals let the groupby work on integer codes
+        melted = melted.astype({'disease': 'category', 'symptom': 'category'})
+        # ✅ Each pair repeats once per source row: dedupe in bulk (on the integer codes) before aggregating
+        melted = melted.drop_duplicates(subset=['disease', 'symptom'])
+
+        # ✅ One groupby aggregation instead of an iterrows() loop (sort=False keeps first-seen disease order)
+        disease_dict = melted.groupby('disease', sort=False, observed=True)['symptom'].agg(lambda s: sorted(s)).to_dict()
+        disease_dict = {d: s for d, s in disease_dict.items() if s}
         print(f"✅ Built disease dictionary from melted wide data ({len(disease_dict)} diseases).")
 
     except Exception as e:
@@ -152,6 +160,8 @@ def generate_knowledge_base_final_wide():
     print("ℹ️ Generating rules and follow-up questions...")
     missing_severity_symptoms = set()
     missing_description_symptoms = set()
+    symptom_id_parts = _id_parts({symptom for symptoms in disease_dict.values() for symptom in symptoms})
+    disease_id_parts = _id_parts(disease_dict)
 
     for disease, symptoms in disease_dict.items():
         if not symptoms: continue
@@ -176,12 +186,10 @@ def generate_knowledge_base_final_wide():
             if desc: question_text = f"Have you been experiencing {desc.lower()}?"
             else: question_text = f"Have you been suffering from {symptom} lately?"
 
-            question_text = re.sub(r'\s+', ' ', question_text).strip().capitalize()
-            symptom_id_part = re.sub(r'\W+', '_', symptom).strip('_')[:50]
-            disease_id_part = re.sub(r'\W+', '_', disease).strip('_')[:50]
+            question_text = _WS_RE.sub(' ', question_text).strip().capitalize()
 
             rule["follow_ups"].append({
-                "id": f"q_{disease_id_part}_{symptom_id_part}",
+                "id": f"q_{disease_id_parts[disease]}_{symptom_id_parts[symptom]}",
                 "question": question_text,
                 "boosts": [{"name": disease, "value": boost}],
                 "severity": int(severity_level)
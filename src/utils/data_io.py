@@ -0,0 +1,45 @@
+# src/utils/data_io.py
+import os
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import pandas as pd
+
+# Parquet copies are only read when this environment variable is set to 1/true/yes (opt-in)
+USE_PARQUET_ENV = "CHATBOT_USE_PARQUET"
+
+
+def parquet_enabled() -> bool:
+    """Whether read_table should look for Parquet copies (see USE_PARQUET_ENV)."""
+    return os.environ.get(USE_PARQUET_ENV, "").strip().lower() in ("1", "true", "yes")
+
+
+def parquet_sibling(csv_path: Union[str, Path]) -> Path:
+    """Path of the Parquet copy of a CSV (same name, '.parquet' suffix)."""
+    return Path(csv_path).with_suffix(".parquet")
+
+
+def read_table(csv_path: Union[str, Path], usecols: Optional[Callable[[str], bool]] = None,
+               prefer_parquet: Optional[bool] = None, **read_csv_kwargs) -> pd.DataFrame:
+    """
+    Read a data file, optionally preferring an up-to-date Parquet copy next to the CSV.
+    Parquet is considered only when prefer_parquet is True (default: the CHATBOT_USE_PARQUET
+    environment variable). The copy (see scripts/convert_to_parquet.py) is used only if it is not
+    older than the CSV; otherwise, or if it cannot be read, the CSV is parsed with pd.read_csv.
+    'usecols' may be a callable column filter, applied to either format.
+    """
+    if prefer_parquet is None:
+        prefer_parquet = parquet_enabled()
+    parquet_path = parquet_sibling(csv_path)
+    try:
+        if prefer_parquet and os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path):
+            df = pd.read_parquet(parquet_path)
+            if usecols is not None:
+                df = df[[col for col in df.columns if usecols(col)]]
+            return df
+    except (OSError, ImportError, ValueError):
+        pass # No usable Parquet copy (missing file or engine); fall back to CSV
+
+    if usecols is not None:
+        read_csv_kwargs["usecols"] = usecols
+    return pd.read_csv(csv_path, **read_csv_kwargs)
@@ -4,6 +4,15 @@ import joblib
 import os
 import re
 
+# Optional: pyarrow-backed string columns (compact, with vectorized .str kernels); plain object columns otherwise
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+TEXT_DTYPE = "string[pyarrow]" if pyarrow is not None else object
+CSV_ENGINE = "pyarrow" if pyarrow is not None else "c" # pyarrow parses with multiple threads
+
 # --- Configuration: Define all data file paths ---
 DATA_DIR = "data"
 MODELS_DIR = "models"
@@ -29,6 +38,16 @@ def clean_text(text):
     text = re.sub(r'\s+', ' ', text).strip()
     return text
 
+def clean_series(s: pd.Series) -> pd.Series:
+    """Vectorized clean_text for a whole column (non-string values become "")."""
+    return (
+        s.astype(object).str.lower()
+        .str.replace(r'[^a-z0-9\s,]', '', regex=True)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+        .fillna('')
+    )
+
 def process_kaggle_symptom_df(df: pd.DataFrame) -> pd.DataFrame:
     """
     Transforms the wide-format Kaggle symptom dataset (dataset.csv)
@@ -45,12 +64,10 @@ def process_kaggle_symptom_df(df: pd.DataFrame) -> pd.DataFrame:
         print(f"❌ CRITICAL ERROR: Could not find 'disease' or 'symptom_' columns in 'dataset.csv': {e}.")
         return pd.DataFrame(columns=['disease', 'symptom_text'])
 
-    df['symptom_text'] = df[symptom_cols].apply(
-        lambda row: ', '.join(
-            str(s).strip().replace('_', ' ') for s in row if pd.notna(s) and str(s).strip()
-        ),
-        axis=1
-    )
+    # ✅ Strip and de-underscore column-wise with .str ops; only the comma-join runs per row (over a NumPy array)
+    cells = df[symptom_cols].fillna('').astype(str).apply(lambda col: col.str.strip().str.replace('_', ' ', regex=False))
+    cells = cells.to_numpy()
+    df['symptom_text'] = [', '.join(s for s in row if s) for row in cells]
 
     print(f"✅ Processed Kaggle dataset successfully.")
     return df[[disease_col, 'symptom_text']].rename(columns={disease_col: 'disease'})
@@ -63,11 +80,12 @@ def load_and_merge_all_data():
     print("🚀 Starting Comprehensive Data Merge Process...")
     
     try:
-        df_base = pd.read_csv(FILES["base_symptoms"])
-        df_kaggle = pd.read_csv(FILES["kaggle_symptoms"])
-        df_desc = pd.read_csv(FILES["description"])
-        df_sev = pd.read_csv(FILES["severity"])
-        df_prec = pd.read_csv(FILES["precaution"])
+        # ✅ Multithreaded pyarrow parser; all-text files load as compact string columns instead of object arrays
+        df_base = pd.read_csv(FILES["base_symptoms"], dtype=TEXT_DTYPE, engine=CSV_ENGINE)
+        df_kaggle = pd.read_csv(FILES["kaggle_symptoms"], dtype=TEXT_DTYPE, engine=CSV_ENGINE)
+        df_desc = pd.read_csv(FILES["description"], dtype=TEXT_DTYPE, engine=CSV_ENGINE)
+        df_sev = pd.read_csv(FILES["severity"], engine=CSV_ENGINE)
+        df_prec = pd.read_csv(FILES["precaution"], dtype=TEXT_DTYPE, engine=CSV_ENGINE)
         print("✅ All source datasets loaded successfully.")
     except FileNotFoundError as e:
         print(f"❌ CRITICAL ERROR: File not found - {e}. Please ensure all datasets are in the '{DATA_DIR}' folder.")
@@ -80,6 +98,8 @@ def load_and_merge_all_data():
     df_desc.columns = [col.strip().lower() for col in df_desc.columns]
     df_sev.columns = [col.strip().lower() for col in df_sev.columns]
     df_sev.rename(columns={'symptom': 'symptom', 'weight': 'severity_weight'}, inplace=True)
+    if 'severity_weight' in df_sev.columns:
+        df_sev['severity_weight'] = pd.to_numeric(df_sev['severity_weight'], downcast='integer') # 1-7 fits in int8
     df_prec.columns = [col.strip().lower() for col in df_prec.columns]
 
     # --- Combine and Merge ---
@@ -88,7 +108,7 @@ def load_and_merge_all_data():
     for df in [all_symptoms, df_desc, df_prec]: 
         if 'disease' in df.columns:
             df['disease'] = df['disease'].str.strip()
-    all_symptoms['symptom_text'] = all_symptoms['symptom_text'].apply(clean_text)
+    all_symptoms['symptom_text'] = clean_series(all_symptoms['symptom_text'])
 
     # Merge description and precautions
     merged = all_symptoms.merge(df_desc, on='disease', how='left')
@@ -98,15 +118,11 @@ def load_and_merge_all_data():
     merged.fillna('', inplace=True)
     
     # --- Feature Engineering: Create a rich text feature for the model ---
-    merged['training_text'] = (
-        merged['symptom_text'] + ' ' + 
-        merged.get('description', '') + ' ' +
-        merged.get('precaution_1', '') + ' ' +
-        merged.get('precaution_2', '') + ' ' +
-        merged.get('precaution_3', '') + ' ' +
-        merged.get('precaution_4', '')
-    )
-    merged['training_text'] = merged['training_text'].apply(clean_text)
+    # ✅ One str.cat pass instead of a new intermediate Series per '+'
+    text_cols = ['description', 'precaution_1', 'precaution_2', 'precaution_3', 'precaution_4']
+    others = [merged[c].astype(str) if c in merged.columns else pd.Series('', index=merged.index) for c in text_cols]
+    merged['training_text'] = merged['symptom_text'].astype(str).str.cat(others, sep=' ', na_rep='')
+    merged['training_text'] = clean_series(merged['training_text'])
 
     merged = merged[merged['training_text'] != ''].copy()
 
@@ -0,0 +1,95 @@
+# src/utils/overpass.py
+import threading
+
+import numpy as np
+import requests
+
+# Optional: orjson to parse the (possibly multi-MB) response bytes faster than the stdlib json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional: cachetools for the response TTL cache; without it every call goes to the API
+try:
+    from cachetools import TTLCache
+except ImportError:
+    TTLCache = None
+
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+REQUEST_TIMEOUT_S = 30
+
+# Exceptions the locators treat as "API request failed"
+REQUEST_ERRORS = (requests.RequestException,)
+
+EARTH_RADIUS_KM = 6371.0088 # Mean Earth radius (IUGG)
+
+# Successful responses are reused for 15 minutes, keyed by cache_key() (~100 m coordinate buckets)
+CACHE_TTL_S = 900
+_CACHE = TTLCache(maxsize=1024, ttl=CACHE_TTL_S) if TTLCache is not None else None
+_CACHE_LOCK = threading.Lock() # TTLCache is not thread-safe (Streamlit runs sessions in threads)
+_INFLIGHT = {} # cache key -> [threading.Lock, waiter count], so concurrent misses for one key make a single request
+_INFLIGHT_LOCK = threading.Lock() # Guards _INFLIGHT itself
+
+
+def cache_key(kind: str, latitude: float, longitude: float, radius: int, name_filter: str = None) -> tuple:
+    """Response cache key: coordinates rounded to 3 decimals (~100 m), plus radius and filter."""
+    return (kind, round(latitude, 3), round(longitude, 3), radius, name_filter or "")
+
+
+def _cache_get(key):
+    if _CACHE is None or key is None:
+        return None
+    with _CACHE_LOCK:
+        return _CACHE.get(key)
+
+
+def _cache_put(key, data: dict):
+    if _CACHE is not None and key is not None:
+        with _CACHE_LOCK:
+            _CACHE[key] = data
+
+
+def haversine_km(latitude: float, longitude: float, lats, lons) -> np.ndarray:
+    """Great-circle distances (km) from one point to arrays of points, in one vectorized pass."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    dlat = np.radians(lats - latitude)
+    dlon = np.radians(lons - longitude)
+    a = np.sin(dlat / 2) ** 2 + np.cos(np.radians(latitude)) * np.cos(np.radians(lats)) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def post_query(query: str, url: str = OVERPASS_URL, key: tuple = None) -> dict:
+    """
+    Run an Overpass QL query with a blocking POST (no URL-length limit, unlike GET) and return the JSON.
+    With a cache key, a fresh cached response is returned instead of calling the API, and concurrent
+    misses on the same key (e.g. two Streamlit sessions) wait for one shared request.
+    """
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+    if key is None or _CACHE is None:
+        return _fetch(query, url)
+    with _INFLIGHT_LOCK:
+        entry = _INFLIGHT.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            cached = _cache_get(key) # Filled by whoever held the lock first
+            if cached is not None:
+                return cached
+            data = _fetch(query, url)
+            _cache_put(key, data)
+            return data
+    finally:
+        with _INFLIGHT_LOCK:
+            entry[1] -= 1
+            if not entry[1]:
+                _INFLIGHT.pop(key, None)
+
+
+def _fetch(query: str, url: str) -> dict:
+    response = requests.post(url, data={"data": query}, timeout=REQUEST_TIMEOUT_S)
+    response.raise_for_status()
+    return orjson.loads(response.content) if orjson else response.json()
@@ -1,8 +1,26 @@
 # src/utils/text_cleaner.py
-import re
+import string
 import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
 
+class _KeepCharsTable(dict):
+    """
+    str.translate table that keeps English letters, Arabic letters (U+0621-U+064A) and whitespace,
+    and deletes every other character. Entries are filled in lazily the first time a code point is seen,
+    so the table covers all of Unicode without being built up front.
+    """
+
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        keep = char in string.ascii_letters or 0x0621 <= codepoint <= 0x064A or char.isspace()
+        self[codepoint] = codepoint if keep else None
+        return self[codepoint]
+
+
+# Shared by all TextCleaner instances (one C-level translate pass per text, no regex)
+_KEEP_CHARS_TABLE = _KeepCharsTable()
+
+
 class TextCleaner(BaseEstimator, TransformerMixin):
     """
     Custom transformer to clean text data (supports English and Arabic).
@@ -11,14 +29,9 @@ class TextCleaner(BaseEstimator, TransformerMixin):
     """
 
     def __init__(self):
-        """Initialize the cleaner and compile regex patterns for efficiency."""
-        # Compile regex patterns once for slightly better performance
-        # Pattern to keep only English letters, Arabic letters, and whitespace
-        self.unwanted_chars_pattern = re.compile(r"[^a-zA-Z\u0621-\u064A\s]")
-        # Pattern to replace multiple whitespace characters with a single space
-        self.multiple_spaces_pattern = re.compile(r'\s+')
+        """Initialize the cleaner (the character table is shared at module level)."""
         # Optional: Confirmation message (can be removed in production)
-        # print("✅ TextCleaner initialized with compiled regex patterns.")
+        # print("✅ TextCleaner initialized.")
 
     def fit(self, X, y=None):
         """
@@ -38,12 +51,8 @@ class TextCleaner(BaseEstimator, TransformerMixin):
             try:
                 # Ensure input is treated as string, handle None
                 text_str = str(text) if text is not None else ""
-                # Remove unwanted characters using the pre-compiled pattern
-                cleaned = self.unwanted_chars_pattern.sub('', text_str)
-                # Normalize multiple spaces using the pre-compiled pattern
-                cleaned = self.multiple_spaces_pattern.sub(' ', cleaned)
-                # Convert to lowercase and remove leading/trailing whitespace
-                return cleaned.lower().strip()
+                # ✅ Delete unwanted characters with str.translate, then collapse whitespace with split/join
+                return " ".join(text_str.translate(_KEEP_CHARS_TABLE).split()).lower()
             except Exception as e:
                 # Log error and return empty string if cleaning fails unexpectedly
                 print(f"⚠️ Warning: Error cleaning text: '{text}'. Error: {e}")
@@ -51,8 +60,10 @@ class TextCleaner(BaseEstimator, TransformerMixin):
 
         # Apply the cleaning function based on the input type
         if isinstance(X, pd.Series):
-            # Apply element-wise if it's a pandas Series
-            return X.apply(clean_single_text)
+            # ✅ Plain comprehension over the values (same index/name): the per-text work is already one
+            # C-level translate + split/join, so Series.apply's dispatch is pure overhead here, and a
+            # chained .str pipeline (regex or pyarrow) measured slower than this
+            return pd.Series([clean_single_text(text) for text in X.tolist()], index=X.index, name=X.name, dtype=object)
         elif isinstance(X, list):
             # Apply to each element if it's a list using list comprehension
             return [clean_single_text(text) for text in X]
@@ -16,6 +16,9 @@ except ImportError:
 
 from src.chatbot_system.diagnosis_agent import DiagnosisAgent
 
+# Unpatched loader, for tests that exercise it against a mocked CSV
+_real_load_fallback_dataset = DiagnosisAgent.load_fallback_dataset
+
 # 'mocker' is a fixture provided by the 'pytest-mock' plugin
 @pytest.fixture
 def agent(mocker):
@@ -99,6 +102,23 @@ def test_combine_scores_capping_at_one(agent):
     print("✅ Score capping at 1.0 works.")
 
 
+def test_combine_scores_accepts_mixed_case_boosts(agent):
+    """
+    Tests that follow-up boosts keyed with mixed case still apply to the lowercase disease.
+    """
+    print("\n🔬 Testing _combine_scores with mixed-case boost keys...")
+    ml_scores = {'flu': 0.5}
+    rule_scores = {'flu': 0.5}
+    csv_scores = {'flu': 0.0}
+
+    lower = agent._combine_scores(ml_scores, rule_scores, csv_scores=csv_scores, followup_boosts={'flu': 0.2})
+    mixed = agent._combine_scores(ml_scores, rule_scores, csv_scores=csv_scores, followup_boosts={' Flu ': 0.2})
+
+    assert mixed == pytest.approx(lower), "Mixed-case boost keys should match lowercase diseases."
+    assert 'Flu' not in mixed and ' Flu ' not in mixed
+    print("✅ Mixed-case boost keys are normalized.")
+
+
 def test_predict_with_mocked_scorers(agent, mocker):
     """
     Tests the main predict() function logic (sorting, formatting, follow-ups)
@@ -153,4 +173,51 @@ def test_predict_with_mocked_scorers(agent, mocker):
     assert "follow_up_questions" in preds[1]
     assert "follow_up_questions" in preds[2]
 
-    print("✅ predict() function logic (sorting, formatting, follow-up handling) seems correct.")
\ No newline at end of file
+    print("✅ predict() function logic (sorting, formatting, follow-up handling) seems correct.")
+
+def test_rule_match_scores_multi_word_symptoms(agent):
+    """
+    Tests _rule_match_scores against slotted KBRule objects:
+    multi-word symptoms only match when all their words are present.
+    """
+    print("\n🔬 Testing _rule_match_scores with KBRule objects...")
+    from src.chatbot_system.diagnosis_agent import KBRule
+
+    agent.kb_rules = [
+        KBRule.from_dict({
+            "symptoms": ["sore throat", "fever", "runny nose", "cough"],
+            "conditions": [{"name": " Common Cold ", "score": 0.8}],
+            "follow_ups": [],
+        }),
+        KBRule.from_dict({
+            "symptoms": ["chest pain", "shortness of breath"],
+            "conditions": [{"name": "angina", "score": 0.9}],
+            "follow_ups": [],
+        }),
+    ]
+
+    scores = agent._rule_match_scores("i have a sore throat and fever with chest")
+
+    # 2 of 4 symptoms matched -> 0.8 * 0.5 = 0.4; condition name is canonicalized
+    assert scores == {"common cold": pytest.approx(0.4)}
+    print("✅ Rule matching respects multi-word symptoms.")
+
+
+def test_fallback_csv_keeps_disease_case(agent, mocker):
+    """
+    Tests that the fallback CSV disease names are only stripped at load time (case kept),
+    so CSV scores stay keyed exactly as before and the ranking is unchanged.
+    """
+    import pandas as pd
+    print("\n🔬 Testing fallback CSV disease keys...")
+    df = pd.DataFrame({"Disease": [" Malaria ", "flu"], "Symptom_1": ["chills", "chills"], "Symptom_2": ["high_fever", None]})
+    mocker.patch('src.chatbot_system.diagnosis_agent.os.path.exists', return_value=True)
+    mocker.patch('src.chatbot_system.diagnosis_agent.pd.read_csv', return_value=df)
+
+    _real_load_fallback_dataset(agent)
+    assert list(agent.fallback_data_wide["disease"]) == ["Malaria", "flu"]
+
+    # "chills" matches 1 of Malaria's 2 symptoms and flu's only one
+    scores = agent._csv_fallback_scores("chills and fever")
+    assert scores == {"Malaria": 0.5, "flu": 1.0}
+    print("✅ Fallback CSV disease keys keep their case.")
@@ -1,6 +1,8 @@
 # ============================================================
 # 🔬 Pytest — FollowUpManager Unit Tests (Logic)
 # ============================================================
+import io
+import json
 import pytest
 from src.chatbot_system.followup_manager import FollowUpManager
 
@@ -84,6 +86,33 @@ def test_reorder_queue_logic(manager):
     assert ordered_ids == expected_order
     print("✅ Queue prioritization logic is correct.")
 
+def test_disease_scoped_pop_keeps_global_order(manager):
+    """
+    Tests that popping a question for one disease removes it from the
+    global queue without disturbing the priority order of the rest.
+    """
+    print("\n🔬 Testing disease-scoped pop against the global queue...")
+    manager.add_questions([
+        {"id": "flu_low", "question": "q1", "severity": 2, "disease": "flu"},
+        {"id": "cold_high", "question": "q2", "severity": 5, "disease": "cold"},
+        {"id": "flu_high", "question": "q3", "severity": 4, "disease": "flu"},
+        {"id": "cold_low", "question": "q4", "severity": 1, "disease": "cold"},
+    ])
+
+    assert manager.pending_count == 4
+    q = manager.get_next_question_for_disease("Flu")
+    assert q["id"] == "flu_high"
+    assert manager.pending_count == len(manager.pending_questions) == 3
+    assert q["asked"] is True
+    assert manager.has_followup_questions("flu")
+
+    assert manager.peek_next_question()["id"] == "cold_high"
+    popped = [manager.get_next_question()["id"] for _ in range(3)]
+    assert popped == ["cold_high", "flu_low", "cold_low"]
+    assert manager.get_next_question() is None
+    assert not manager.has_pending_questions()
+    print("✅ Disease-scoped pop leaves the global order intact.")
+
 # ------------------------------------------------------------
 # Test Answer Recording & Boost Calculation
 # ------------------------------------------------------------
@@ -137,4 +166,106 @@ def test_record_answer_partial(manager_with_question):
     # cold boost = 0.1 * 0.5 = 0.05
     assert boosts.get("flu") == pytest.approx(0.15)
     assert boosts.get("common cold") == pytest.approx(0.05)
-    print("✅ 'partial_yes' answer applied 50% boosts correctly.")
\ No newline at end of file
+    print("✅ 'partial_yes' answer applied 50% boosts correctly.")
+
+def test_followup_score_uses_own_disease_boosts(manager_with_question):
+    """Tests the follow-up score counts only boosts toward the question's own disease."""
+    print("\n🔬 Testing follow-up score...")
+    manager_with_question.add_questions([{"id": "flu_q2", "question": "Body aches?", "severity": 3,
+                                          "boosts": [{"name": "flu", "value": 0.1}], "disease": "flu"}])
+    manager_with_question.record_answer("flu_q1", "yes")
+
+    assert manager_with_question.get_followup_score("flu") == pytest.approx(1.0)
+    assert manager_with_question.get_followup_score("FLU", include_unasked=True) == pytest.approx(0.75)
+    assert manager_with_question.get_followup_score("common cold") == 0.0
+
+    # A new answer must invalidate the memoized score: (0.3 + 0.1 * -0.5) / 0.4
+    manager_with_question.record_answer("flu_q2", "no")
+    assert manager_with_question.get_followup_score("flu") == pytest.approx(0.625)
+
+    restored = FollowUpManager()
+    restored.from_json(manager_with_question.to_json())
+    assert restored.get_followup_score("flu", include_unasked=True) == pytest.approx(0.625)
+    print("✅ Follow-up score computed correctly.")
+
+# ------------------------------------------------------------
+# Test State Persistence
+# ------------------------------------------------------------
+
+def test_dump_state_round_trip(manager_with_question):
+    """Tests that the streamed dump_state output is valid JSON matching export_state."""
+    print("\n🔬 Testing dump_state / load_state round trip...")
+    manager_with_question.add_questions([{"id": "cold_q1", "question": "Runny nose?", "severity": 2, "disease": "common cold"}])
+    manager_with_question.record_answer("flu_q1", "نعم")
+
+    buf = io.StringIO()
+    manager_with_question.dump_state(buf)
+    assert json.loads(buf.getvalue()) == json.loads(manager_with_question.to_json())
+
+    buf.seek(0)
+    restored = FollowUpManager()
+    restored.load_state(buf)
+    assert restored.get_all_answers() == manager_with_question.get_all_answers()
+    assert restored.get_disease_boosts() == manager_with_question.get_disease_boosts()
+    assert [q["id"] for q in restored.pending_questions] == ["flu_q1", "cold_q1"]
+    print("✅ dump_state round trip works.")
+
+def test_export_cache_invalidated_on_mutation(manager_with_question):
+    """Tests that the cached export is reused until the state changes."""
+    print("\n🔬 Testing export_state caching...")
+    first = manager_with_question.export_state()
+    assert manager_with_question.export_state() == first
+
+    # The export is a copy: editing it must not leak into the cache or the manager
+    first["user_answers"]["flu_q1"] = {"answer": "yes", "timestamp": None}
+    first["pending_questions"].clear()
+    assert manager_with_question.export_state()["user_answers"] == {}
+    assert len(manager_with_question.export_state()["pending_questions"]) == 1
+
+    manager_with_question.record_answer("flu_q1", "yes")
+    assert "flu_q1" in json.loads(manager_with_question.to_json())["user_answers"]
+
+    manager_with_question.get_next_question()
+    assert json.loads(manager_with_question.to_json())["pending_questions"] == []
+    print("✅ export_state cache refreshes after mutations.")
+
+def test_followup_score_tracks_negative_multiplier(manager_with_question):
+    """Tests that changing negative_boost_multiplier is not hidden by the memoized score."""
+    print("\n🔬 Testing follow-up score after a multiplier change...")
+    manager_with_question.add_questions([{"id": "flu_q2", "question": "Body aches?", "severity": 3,
+                                          "boosts": [{"name": "flu", "value": 0.1}], "disease": "flu"}])
+    manager_with_question.record_answer("flu_q1", "yes")
+    manager_with_question.record_answer("flu_q2", "no")
+    # (0.3 + 0.1 * -0.5) / 0.4
+    assert manager_with_question.get_followup_score("flu") == pytest.approx(0.625)
+
+    manager_with_question.negative_boost_multiplier = -1.0
+    # (0.3 + 0.1 * -1.0) / 0.4
+    assert manager_with_question.get_followup_score("flu") == pytest.approx(0.5)
+    print("✅ Follow-up score follows the current multiplier.")
+
+def test_public_state_views_are_read_only(manager_with_question):
+    """Tests that answers/meta/boosts can only change through methods that refresh the export."""
+    print("\n🔬 Testing read-only state views...")
+    manager_with_question.to_json()
+    with pytest.raises(TypeError):
+        manager_with_question.user_answers["flu_q1"] = {"answer": "yes", "timestamp": None}
+    with pytest.raises(TypeError):
+        manager_with_question.disease_boosts["flu"] = 1.0
+    with pytest.raises(TypeError):
+        manager_with_question.question_meta["x"] = {}
+
+    manager_with_question.record_answer("flu_q1", "yes")
+    assert manager_with_question.user_answers["flu_q1"]["answer"] == "yes"
+    assert json.loads(manager_with_question.to_json())["disease_boosts"] == dict(manager_with_question.disease_boosts)
+    print("✅ State views are read-only and exports stay fresh.")
+
+def test_answer_timestamps_keep_microseconds(manager_with_question, monkeypatch):
+    """Tests that answers recorded within one second still get distinct, ordered timestamps."""
+    print("\n🔬 Testing answer timestamp precision...")
+    ticks = iter([1_700_000_000_000_100_000, 1_700_000_000_000_200_000, 1_700_000_001_000_000_000])
+    monkeypatch.setattr("src.chatbot_system.followup_manager.time.time_ns", lambda: next(ticks))
+
+    stamps = [manager_with_question._utc_now_iso() for _ in range(3)]
+    assert stamps == ["2023-11-14T22:13:20.000100", "2023-11-14T22:13:20.000200", "2023-11-14T22:13:21"]
+    print("✅ Timestamps keep microsecond precision.")
@@ -0,0 +1,144 @@
+# ============================================================
+# 🔬 Pytest — FastAPI app (src/main.py): micro-batching & lifecycle
+# ============================================================
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+project_root = str(Path(__file__).resolve().parents[1])
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src import main
+
+
+class FakeModel:
+    """Stands in for the sklearn pipeline: records each predict_proba batch, returns fixed rows."""
+
+    def __init__(self, n_classes):
+        self.n_classes = n_classes
+        self.calls = []
+        self.threads = []
+        self.error = None
+
+    def predict_proba(self, texts):
+        self.calls.append(list(texts))
+        self.threads.append(threading.current_thread().name)
+        if self.error:
+            raise self.error
+        probs = np.zeros((len(texts), self.n_classes))
+        probs[:, 0] = 1.0
+        return probs
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    """Replace the loaded model with a fake one (the endpoints only need truthy pipeline/encoder)."""
+    classes = ("alpha", "beta", "gamma")
+    model = FakeModel(len(classes))
+    monkeypatch.setattr(main, "ml_model", model)
+    monkeypatch.setattr(main, "model_pipeline", model)
+    monkeypatch.setattr(main, "label_encoder", object())
+    monkeypatch.setattr(main, "CLASSES", classes)
+    yield model
+    main.shutdown_executor()
+
+
+def run_app_cycle(coro_factory):
+    """Run startup -> request(s) -> shutdown on a fresh event loop, like one server lifetime."""
+    async def cycle():
+        await main.start_batch_worker()
+        try:
+            return await coro_factory()
+        finally:
+            main.shutdown_executor()
+    return asyncio.run(cycle())
+
+
+def test_predict_works_after_shutdown_and_restart(fake_model):
+    """A shutdown -> startup cycle in one process must not leave a dead executor or worker behind."""
+    req = main.SymptomRequest(text="fever and headache", top_k=2)
+    first = run_app_cycle(lambda: main.predict_v2(req))
+    second = run_app_cycle(lambda: main.predict_v2(req))
+    assert first["predictions"][0]["disease"] == "alpha"
+    assert second == first
+    assert main.EXECUTOR is None
+
+
+def test_concurrent_requests_share_one_predict_call(fake_model):
+    """Requests arriving together are coalesced into a single predict_proba batch."""
+    async def burst():
+        reqs = [main.SymptomRequest(text=f"symptom {i}") for i in range(5)]
+        return await asyncio.gather(*(main.predict_v2(r) for r in reqs))
+
+    results = run_app_cycle(burst)
+    assert len(results) == 5
+    assert len(fake_model.calls) == 1
+    assert len(fake_model.calls[0]) == 5
+
+
+def test_batches_are_capped_at_max_batch(fake_model, monkeypatch):
+    """More concurrent requests than MAX_BATCH are split into several predict_proba calls, in order."""
+    monkeypatch.setattr(main, "MAX_BATCH", 2)
+
+    async def burst():
+        reqs = [main.SymptomRequest(text=f"symptom {i}") for i in range(5)]
+        return await asyncio.gather(*(main.predict_v2(r) for r in reqs))
+
+    results = run_app_cycle(burst)
+    assert [r["input_text"] for r in results] == [f"symptom {i}" for i in range(5)]
+    assert [len(call) for call in fake_model.calls] == [2, 2, 1]
+    assert all(name.startswith("predict") for name in fake_model.threads)
+
+
+def test_model_error_fails_every_request_in_the_batch(fake_model):
+    """An exception in predict_proba becomes a 500 for each waiting request, and the worker keeps running."""
+    fake_model.error = RuntimeError("boom")
+
+    async def burst():
+        reqs = [main.SymptomRequest(text=f"symptom {i}") for i in range(3)]
+        outcomes = await asyncio.gather(*(main.predict_v2(r) for r in reqs), return_exceptions=True)
+        fake_model.error = None
+        return outcomes, await main.predict_v2(main.SymptomRequest(text="after"))
+
+    outcomes, after = run_app_cycle(burst)
+    assert all(isinstance(o, main.HTTPException) and o.status_code == 500 for o in outcomes)
+    assert after["input_text"] == "after"
+
+
+def test_dead_worker_is_restarted_on_next_request(fake_model):
+    """If the batch worker task has died, the next enqueue starts a new one instead of hanging."""
+    async def scenario():
+        main._batch_task.cancel()
+        await asyncio.sleep(0)
+        assert main._batch_task.done()
+        result = await asyncio.wait_for(main.predict_v2(main.SymptomRequest(text="fever")), timeout=5)
+        assert not main._batch_task.done()
+        return result
+
+    result = run_app_cycle(scenario)
+    assert result["predictions"][0]["disease"] == "alpha"
+
+
+def test_predict_batch_runs_on_executor_in_one_call(fake_model):
+    """/predict_batch returns one result per text from a single predict_proba call off the event loop."""
+    req = main.BatchRequest(texts=["fever", "cough", "rash"], top_k=2)
+    response = run_app_cycle(lambda: main.predict_batch(req))
+    assert [r["input_text"] for r in response["results"]] == req.texts
+    assert len(fake_model.calls) == 1 and len(fake_model.calls[0]) == 3
+    assert fake_model.threads[0].startswith("predict")
+    assert run_app_cycle(lambda: main.predict_batch(main.BatchRequest(texts=[]))) == {"results": []}
+
+
+def test_predict_batch_rejects_oversized_requests(fake_model, monkeypatch):
+    """Requests over MAX_BATCH_TEXTS get a 413 before any inference runs."""
+    monkeypatch.setattr(main, "MAX_BATCH_TEXTS", 2)
+    req = main.BatchRequest(texts=["a", "b", "c"])
+    with pytest.raises(main.HTTPException) as exc_info:
+        run_app_cycle(lambda: main.predict_batch(req))
+    assert exc_info.value.status_code == 413
+    assert fake_model.calls == []
@@ -0,0 +1,139 @@
+# ============================================================
+# 🔬 Pytest — Overpass transport (src/utils/overpass.py)
+# ============================================================
+import threading
+import time
+
+import numpy as np
+import pytest
+import requests
+
+from src.utils import overpass
+from src.pharmacy_locator_osm import PharmacyLocator
+
+# The response cache (and so single-flight) needs the optional cachetools package
+needs_cache = pytest.mark.skipif(overpass.TTLCache is None, reason="cachetools not installed")
+
+
+def clear_cache():
+    if overpass._CACHE is not None:
+        overpass._CACHE.clear()
+
+
+class FakeResponse:
+    """Minimal requests.Response stand-in: JSON bytes + raise_for_status."""
+
+    def __init__(self, payload=b'{"elements": []}', status=200):
+        self.content = payload
+        self.status = status
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise requests.HTTPError(f"{self.status} Error")
+
+    def json(self):
+        import json
+        return json.loads(self.content)
+
+
+@pytest.fixture
+def fake_post(monkeypatch):
+    """Replace requests.post and start every test with an empty cache; returns the list of calls."""
+    calls = []
+
+    def post(url, data=None, timeout=None):
+        calls.append((url, data, timeout))
+        return FakeResponse(b'{"elements": [{"lat": 30.0, "lon": 31.0}]}')
+
+    monkeypatch.setattr(overpass.requests, "post", post)
+    clear_cache()
+    yield calls
+    clear_cache()
+
+
+def test_post_query_sends_query_as_form_body(fake_post):
+    """The query goes in the POST body (not the URL) with the module timeout."""
+    data = overpass.post_query("[out:json];node(1);out;", "http://overpass.test/api")
+    assert data == {"elements": [{"lat": 30.0, "lon": 31.0}]}
+    assert fake_post == [("http://overpass.test/api", {"data": "[out:json];node(1);out;"}, overpass.REQUEST_TIMEOUT_S)]
+
+
+def test_post_query_raises_http_errors(monkeypatch):
+    """HTTP errors surface as requests exceptions (caught by the locators via REQUEST_ERRORS)."""
+    monkeypatch.setattr(overpass.requests, "post", lambda *a, **k: FakeResponse(b"", status=504))
+    with pytest.raises(overpass.REQUEST_ERRORS):
+        overpass.post_query("q", key=("pharmacy", 0.0, 0.0, 100, "fail"))
+    assert overpass._cache_get(("pharmacy", 0.0, 0.0, 100, "fail")) is None # Failures are not cached
+
+
+@needs_cache
+def test_cache_reuses_responses_per_key_until_ttl(fake_post, monkeypatch):
+    """Same key within the TTL -> one API call; a different key or an expired entry -> a new call."""
+    key = overpass.cache_key("pharmacy", 30.04441, 31.23572, 5000)
+    near = overpass.cache_key("pharmacy", 30.04438, 31.23568, 5000) # Same ~100 m bucket
+    assert key == near
+
+    first = overpass.post_query("q", key=key)
+    assert overpass.post_query("q", key=near) is first
+    assert len(fake_post) == 1
+
+    overpass.post_query("q", key=overpass.cache_key("pharmacy", 30.0444, 31.2357, 5000, "Seif"))
+    assert len(fake_post) == 2
+
+    # A cache whose clock has moved past the TTL drops the entry
+    clear_cache()
+    now = time.monotonic()
+    monkeypatch.setattr(overpass, "_CACHE", overpass.TTLCache(maxsize=8, ttl=overpass.CACHE_TTL_S, timer=lambda: now))
+    overpass.post_query("q", key=key)
+    now += overpass.CACHE_TTL_S + 1
+    overpass.post_query("q", key=key)
+    assert len(fake_post) == 4
+
+
+@needs_cache
+def test_concurrent_misses_share_one_request(monkeypatch):
+    """Threads missing the cache on the same key wait for one in-flight request (single-flight)."""
+    clear_cache()
+    calls = []
+    release = threading.Event()
+
+    def slow_post(url, data=None, timeout=None):
+        calls.append(data)
+        release.wait(5)
+        return FakeResponse()
+
+    monkeypatch.setattr(overpass.requests, "post", slow_post)
+    key = overpass.cache_key("radiology", 30.0, 31.0, 2000)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(overpass.post_query("q", key=key))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1) # Let every thread reach the per-key lock
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 4 and all(r is results[0] for r in results)
+    assert overpass._INFLIGHT == {}
+    clear_cache()
+
+
+def test_haversine_km_matches_known_distances():
+    """Vectorized distances agree with reference values and handle the zero distance."""
+    # Cairo -> Alexandria is ~179 km; one degree of latitude is ~111.2 km
+    d = overpass.haversine_km(30.0444, 31.2357, [30.0444, 31.2001, 31.0444], [31.2357, 29.9187, 31.2357])
+    assert isinstance(d, np.ndarray) and d.shape == (3,)
+    assert d[0] == pytest.approx(0.0, abs=1e-9)
+    assert d[1] == pytest.approx(179.0, abs=2.0)
+    assert d[2] == pytest.approx(111.2, abs=0.1)
+
+
+def test_locator_sorts_results_by_distance(fake_post, monkeypatch):
+    """The locator parses the mocked response into results ordered nearest first."""
+    payload = (b'{"elements": [{"lat": 30.10, "lon": 31.2357, "tags": {"name": "Far"}},'
+               b'{"lat": 30.05, "lon": 31.2357, "tags": {"name": "Near"}}]}')
+    monkeypatch.setattr(overpass.requests, "post", lambda *a, **k: FakeResponse(payload))
+    results = PharmacyLocator().get_nearby_pharmacies(30.0444, 31.2357, radius=10000)["results"]
+    assert [r["name"] for r in results] == ["Near", "Far"]
+    assert results[0]["distance_km"] < results[1]["distance_km"]
@@ -6,11 +6,13 @@ from difflib import get_close_matches # Import for fuzzy match testing logic if
 
 # Fixture remains the same as the previous correct version
 @pytest.fixture
-def agent(mocker):
+def agent(mocker, monkeypatch):
     """
     Provides a RecommendationAgent instance with mocked DataFrames
     in the expected WIDE format for precautions.
     """
+    # Read the (mocked) CSVs even if Parquet copies exist and CHATBOT_USE_PARQUET is set
+    monkeypatch.delenv("CHATBOT_USE_PARQUET", raising=False)
     # --- Mock Precautions DataFrame (WIDE Format) ---
     prec_data_wide = {
         'disease': ['Flu', 'Common Cold', 'COVID-19', 'flu'],
@@ -65,6 +67,11 @@ def test_get_precautions_not_found(agent):
     precautions = agent.get_precautions("Unknown Disease")
     assert precautions == []
 
+def test_get_precautions_partial_match(agent):
+    # Input inside a key ("common" -> "common cold"), then key inside input ("covid-19 severe" -> "covid-19")
+    assert agent.get_precautions("common") == ['Wash hands']
+    assert agent.get_precautions("COVID-19 severe") == ['Isolate', 'Wear mask']
+
 # --- Test Description Retrieval ---
 def test_get_description_found(agent):
     description = agent._get_description("flu")
@@ -90,6 +97,13 @@ def test_get_details_not_found(agent):
     assert "No specific precautions found" in details["precautions"][0]
     assert "No detailed description is available" in details["description"]
 
+# --- Test Non-String Input ---
+def test_non_string_names_return_empty(agent):
+    """Non-string (even unhashable) names standardize to '' instead of raising."""
+    assert agent._standardize_name(None) == ""
+    assert agent._standardize_name(["flu"]) == ""
+    assert agent.get_precautions({"name": "flu"}) == []
+
 # --- Test Alias ---
 def test_get_recommendations_alias(agent):
     details = agent.get_details("Flu")
@@ -124,4 +138,48 @@ def test_get_details_fuzzy_match(agent):
     # and should return the default message.
     assert "No specific precautions found" in details_typo["precautions"][0], \
         "Precautions should not be found via fuzzy match as 'diabetes' not in prec_map"
-    print("  ✅ Fuzzy match test completed.")
\ No newline at end of file
+    print("  ✅ Fuzzy match test completed.")
+
+# --- Test Assigning Maps Directly ---
+def test_assigned_maps_survive_lazy_load_and_refresh_details(agent):
+    """Tests that assigned maps are not overwritten by the lazy load and drop stale details/indexes."""
+    assert agent.get_details("flu")["precautions"] == ['Drink fluids', 'Rest']
+
+    agent.precaution_map = {"flu": ["Sleep"], "malaria": ["Use nets"]}
+    assert agent.get_details("flu")["precautions"] == ["Sleep"]
+    assert agent.get_precautions("malaria fever") == ["Use nets"] # partial match uses the new index
+
+    fresh = RecommendationAgent()
+    fresh.description_map = {"gout": "Joint inflammation."}
+    assert fresh.description_map == {"gout": "Joint inflammation."}
+    assert fresh.get_details("gout")["description"] == "Joint inflammation."
+    # The map that was not assigned still comes from the CSVs
+    assert fresh.precaution_map["flu"] == ['Drink fluids', 'Rest']
+    assert fresh.get_details("flu")["precautions"] == ['Drink fluids', 'Rest']
+
+
+# --- Test Map Cache Versioning ---
+def test_map_cache_rebuilt_when_version_changes(agent, tmp_path, monkeypatch):
+    """A pickle written by another MAP_CACHE_VERSION is ignored and rewritten from the CSVs."""
+    for name in ("symptom_precaution.csv", "symptom_Description.csv"):
+        (tmp_path / name).write_text("disease\n")
+
+    def make_agent():
+        a = RecommendationAgent(use_map_cache=True)
+        a._data_dir = tmp_path
+        return a
+
+    assert make_agent().precaution_map["flu"] == ['Drink fluids', 'Rest'] # Built from the (mocked) CSVs and cached
+    cache_file = tmp_path / RecommendationAgent.MAP_CACHE_NAME
+    assert cache_file.exists()
+
+    import pickle
+    cached = pickle.loads(cache_file.read_bytes())
+    assert cached["version"] == RecommendationAgent.MAP_CACHE_VERSION
+    cached["prec"] = {"flu": ["stale"]}
+    cache_file.write_bytes(pickle.dumps(cached))
+    assert make_agent().precaution_map["flu"] == ["stale"] # Same version: the cache is trusted
+
+    monkeypatch.setattr(RecommendationAgent, "MAP_CACHE_VERSION", RecommendationAgent.MAP_CACHE_VERSION + 1)
+    assert make_agent().precaution_map["flu"] == ['Drink fluids', 'Rest'] # New version: rebuilt
+    assert pickle.loads(cache_file.read_bytes())["version"] == RecommendationAgent.MAP_CACHE_VERSION
@@ -13,8 +13,10 @@ from src.chatbot_system.symptom_agent import SymptomAgent
 from src.utils.text_cleaner import TextCleaner
 
 @pytest.fixture
-def agent(mocker):
+def agent(mocker, monkeypatch):
     """Provides a SymptomAgent instance with mocked data reflecting observed cleaner behavior."""
+    # Read the (mocked) CSVs even if Parquet copies exist and CHATBOT_USE_PARQUET is set
+    monkeypatch.delenv("CHATBOT_USE_PARQUET", raising=False)
     real_cleaner = TextCleaner()
     mock_symptom_data = [
         "fever", "cough", "headache", "sore throat",
@@ -54,6 +56,16 @@ def test_extract_symptoms_single_and_multi_word(agent):
     # This should pass as "back pain", "headache", "cough" are likely found individually or as ngrams
     assert set(extracted) == {"back pain", "headache", "cough"}
 
+@pytest.mark.parametrize("use_automaton", [True, False])
+def test_extract_symptoms_overlapping_same_start(agent, use_automaton):
+    """A shorter symptom starting at the same word as a longer one is kept on both scan paths."""
+    agent.symptom_set = {"chest", "chest pain", "pain"}
+    agent._symptom_automaton = agent._build_symptom_automaton() if use_automaton else None
+    agent._symptom_re = agent._build_symptom_regex()
+    if use_automaton and agent._symptom_automaton is None:
+        pytest.skip("pyahocorasick not installed")
+    assert agent._extract_symptoms("sharp chest pain today") == ["chest", "chest pain", "pain"]
+
 # ✅ FIX 4: Acknowledge current limitation with multi-word Arabic extraction
 # Mark test as expected to fail (xfail) until _extract_symptoms is improved
 @pytest.mark.xfail(reason="SymptomAgent._extract_symptoms currently fails on multi-word Arabic symptoms")